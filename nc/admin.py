@@ -12,3 +12,4 @@ admin.site.register(models.AccountFundRequest)
 admin.site.register(models.Asset)
 admin.site.register(models.Portfolio)
 admin.site.register(models.RawPortfolioData)
+admin.site.register(models.JobRun)
@@ -0,0 +1,212 @@
+import BaseHTTPServer, datetime, json, random, resource, SocketServer, threading, time, urlparse
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from . import instrumentation
+from .models import Account, Asset, Portfolio, Profile, RawPortfolioData
+
+
+# Per phase thresholds as (max queries, max seconds) given the benchmark size
+# and the configured Horizon latency in seconds. Queries should not grow with
+# the number of portfolios, apart from per collector batch and batched writes
+# (e.g. sqlite limits rows per insert).
+PHASE_THRESHOLDS = {
+    'prices': lambda size, latency: (5, 5.0 + 10 * latency),
+    'record_values': lambda size, latency: (
+        20 + 25 * (size / settings.PORTFOLIO_COLLECTOR_BATCH_SIZE + 1) + size / 10,
+        10.0 + 0.02 * size + size * latency),
+    'performance_stats': lambda size, latency: (5 + size / 100, 5.0 + 0.01 * size),
+    'rank': lambda size, latency: (10, 5.0),
+}
+
+
+class FakeHorizonServer(object):
+    """
+    Local stand-in HTTP server for the Horizon account and order book
+    endpoints and the StellarTerm ticker, responding after a configurable
+    latency.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.accounts = {}
+        self.ticker = { '_meta': { 'externalPrices': { 'USD_XLM': 0.25 } }, 'assets': [] }
+        self.bids = {}
+
+        server = self
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                url = urlparse.urlparse(self.path)
+                params = dict(urlparse.parse_qsl(url.query))
+                if url.path.startswith('/accounts/'):
+                    public_key = url.path.split('/')[2]
+                    body = { 'balances': server.accounts[public_key] }\
+                        if public_key in server.accounts\
+                        else { 'status': 404, 'title': 'Resource Missing' }
+                elif url.path.startswith('/order_book'):
+                    asset_id = '{0}-{1}'.format(params.get('selling_asset_code'),
+                        params.get('selling_asset_issuer'))
+                    bid = server.bids.get(asset_id)
+                    body = { 'bids': [ { 'price': str(bid) } ] if bid else [], 'asks': [] }
+                elif url.path.startswith('/ticker'):
+                    body = server.ticker
+                else:
+                    body = { 'status': 404 }
+
+                data = json.dumps(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self.httpd = Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{0}'.format(self.httpd.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def seed(server, users, accounts_per_user, assets, history=True):
+    """
+    Bulk create users with profiles, portfolios, accounts and assets, and
+    register account balances and asset prices with the fake server.
+
+    If history, also create past raw portfolio data for each performance
+    stat span.
+    """
+    User = get_user_model()
+    rand = random.Random(users)
+    prefix = 'bench{0}'.format(rand.randint(0, 10 ** 6))
+
+    # Assets, with half priced on the ticker and most of the rest with bids
+    # NOTE: bulk_create throughout so no search index updates are triggered
+    if not Asset.objects.filter(asset_id='XLM-native').exists():
+        Asset.objects.bulk_create([ Asset(code='XLM', asset_id='XLM-native') ])
+    model_assets = []
+    for i in range(assets):
+        issuer_address = '{0}{1:016d}'.format('G{0}I'.format(prefix.upper()).ljust(40, 'X'), i)
+        model_assets.append(Asset(code='B{0}'.format(i), issuer_address=issuer_address,
+            asset_id='B{0}-{1}'.format(i, issuer_address)))
+    Asset.objects.bulk_create(model_assets)
+    for i, model_asset in enumerate(model_assets):
+        if i % 2 == 0:
+            server.ticker['assets'].append({ 'id': model_asset.asset_id,
+                'price_XLM': rand.uniform(0.01, 10.0) })
+        elif i % 5 != 1:
+            server.bids[model_asset.asset_id] = rand.uniform(0.01, 10.0)
+
+    # Users with their profiles, portfolios and accounts
+    User.objects.bulk_create([ User(username='{0}_{1}'.format(prefix, i))
+        for i in range(users) ])
+    user_list = list(User.objects.filter(username__startswith=prefix + '_'))
+    Profile.objects.bulk_create([ Profile(user=u) for u in user_list ])
+    profiles = list(Profile.objects.filter(user__in=user_list))
+    Portfolio.objects.bulk_create([ Portfolio(profile=p) for p in profiles ])
+
+    accounts = []
+    for u in user_list:
+        for j in range(accounts_per_user):
+            public_key = 'G{0}{1:08d}{2:04d}'.format(prefix.upper(), u.id, j)
+            accounts.append(Account(user=u, public_key=public_key))
+            balances = [ { 'asset_type': 'native', 'balance': str(rand.uniform(0, 1000)) } ]
+            for model_asset in rand.sample(model_assets, min(3, len(model_assets))):
+                balances.append({ 'asset_type': 'credit_alphanum12',
+                    'asset_code': model_asset.code,
+                    'asset_issuer': model_asset.issuer_address,
+                    'balance': str(rand.uniform(0, 1000)) })
+            server.accounts[public_key] = balances
+    Account.objects.bulk_create(accounts)
+
+    # Past portfolio values over each performance stat span
+    if history:
+        for days in [ 400, 365, 180, 90, 30, 7, 1 ]:
+            batch_start = timezone.now()
+            RawPortfolioData.objects.bulk_create([
+                RawPortfolioData(portfolio_id=p.pk, xlm_value=rand.uniform(1, 1000),
+                    usd_value=rand.uniform(1, 250))
+                for p in profiles
+            ])
+            RawPortfolioData.objects.filter(created__gte=batch_start)\
+                .update(created=batch_start - datetime.timedelta(days=days))
+
+
+def _measure(results, name, func, *args, **kwargs):
+    """
+    Run func, recording its time, query count and growth in peak memory
+    (ru_maxrss in KB) to results under name.
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    with CaptureQueriesContext(connection) as queries:
+        ret = func(*args, **kwargs)
+    results[name] = {
+        'seconds': time.time() - start,
+        'queries': len(queries.captured_queries),
+        'maxrss_growth': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - maxrss,
+    }
+    return ret
+
+
+def run(performance_view, users, accounts_per_user, assets, latency=0.0):
+    """
+    Seed the db and fake server at the given size and run each phase of the
+    performance pipeline against it. Everything written is rolled back.
+
+    NOTE: Stats and rank phases cover every portfolio in the db, so only run
+    against a test database (e.g. set up with django.test.utils.setup_databases).
+
+    Returns tuple of (phase results, call metrics, threshold violations).
+    """
+    server = FakeHorizonServer(latency=latency)
+    server.start()
+    results = {}
+    recorder = instrumentation.JobRecorder('benchmark')
+    try:
+        # NOTE: Local cache so price oracle backoffs don't leak between runs
+        with override_settings(STELLAR_HORIZON=server.url,
+            STELLARTERM_TICKER_URL=server.url + '/ticker.json',
+            CACHES={ 'default': { 'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'benchmark' } }),\
+            instrumentation.activate(recorder),\
+            transaction.atomic():
+            seed(server, users, accounts_per_user, assets)
+
+            asset_prices = _measure(results, 'prices',
+                performance_view._assemble_asset_prices)
+            _measure(results, 'record_values',
+                performance_view._record_portfolio_values, asset_prices)
+            _measure(results, 'performance_stats',
+                performance_view._recalculate_performance_stats)
+            _measure(results, 'rank', performance_view._update_rank_values)
+
+            transaction.set_rollback(True)
+    finally:
+        server.stop()
+
+    violations = []
+    for name, stats in sorted(results.items()):
+        max_queries, max_seconds = PHASE_THRESHOLDS[name](users, latency)
+        if stats['queries'] > max_queries:
+            violations.append('{0}: {1} queries > {2}'.format(name, stats['queries'], max_queries))
+        if stats['seconds'] > max_seconds:
+            violations.append('{0}: {1:.2f} seconds > {2:.2f}'.format(name, stats['seconds'], max_seconds))
+
+    return results, recorder.get_metrics(), violations
@@ -0,0 +1,225 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import fetchers
+from .models import (
+    ExchangeCandle, ExchangeCandleCursor, TradeAggregation, TradeAggregationCoverage,
+)
+
+
+class CandleStore(object):
+    """
+    Serves Kraken OHLC candles for an exchange pair and interval from the
+    db, incrementally fetching only candles newer than the stored 'last'
+    cursor.
+
+    Refreshes happen at most once per refresh period, and concurrent misses
+    for the same pair and interval are collapsed into a single upstream
+    call through a cache lock.
+    """
+    FETCH_LOCK_KEY = 'kraken:candles:fetch:{0}:{1}'
+
+    def __init__(self, pair, interval):
+        self.pair = pair
+        self.interval = interval
+
+    def _cursor(self):
+        return ExchangeCandleCursor.objects.filter(pair=self.pair,
+            interval=self.interval).first()
+
+    def _is_stale(self, cursor):
+        return cursor is None or (timezone.now() - cursor.fetched).total_seconds()\
+            >= settings.KRAKEN_CANDLE_REFRESH
+
+    def _fetch(self, cursor):
+        """
+        Fetch candles since the cursor from Kraken and store them.
+        """
+        params = { 'pair': self.pair, 'interval': self.interval }
+        if cursor:
+            params['since'] = cursor.last
+        json = fetchers.get_json(settings.KRAKEN_TICKER_URL, params=params)
+        if json.get('error'):
+            raise Exception(', '.join(json['error']))
+
+        result = json.get('result', {})
+        ExchangeCandle.objects.store(self.pair, self.interval, result.get(self.pair, []))
+        ExchangeCandleCursor.objects.update_or_create(pair=self.pair, interval=self.interval,
+            defaults={ 'last': result.get('last', cursor.last if cursor else 0),
+                'fetched': timezone.now() })
+
+    def refresh(self):
+        """
+        Fetch newer candles if stored ones are stale and no other request is
+        already fetching them. If nothing is stored yet, waits on the other
+        request's fetch.
+        """
+        cursor = self._cursor()
+        if not self._is_stale(cursor):
+            return
+
+        lock_key = self.FETCH_LOCK_KEY.format(self.pair, self.interval)
+        if cache.add(lock_key, True, settings.KRAKEN_CANDLE_FETCH_LOCK_TIMEOUT):
+            try:
+                self._fetch(cursor)
+            except Exception as e:
+                print 'Error occurred fetching candles for {0}: {1}'.format(self.pair, e)
+            finally:
+                cache.delete(lock_key)
+        elif cursor is None:
+            waited = 0.0
+            while cache.get(lock_key) and waited < settings.KRAKEN_CANDLE_FETCH_LOCK_TIMEOUT:
+                time.sleep(0.1)
+                waited += 0.1
+
+    def get_records(self, since=None, start=None, end=None):
+        """
+        Returns tuple of (records, last) with Kraken OHLC records after
+        since and within (start, end), all in seconds.
+        """
+        self.refresh()
+
+        candles = ExchangeCandle.objects.filter(pair=self.pair, interval=self.interval)
+        if since is not None:
+            candles = candles.filter(time__gt=since)
+        if start is not None:
+            candles = candles.filter(time__gt=start)
+        if end is not None:
+            candles = candles.filter(time__lt=end)
+
+        cursor = self._cursor()
+        return [ c.to_record() for c in candles.order_by('time') ], cursor.last if cursor else None
+
+
+class TradeAggregationStore(object):
+    """
+    Serves Horizon trade aggregation buckets for a non-native asset against
+    XLM at a resolution (in milliseconds).
+
+    Buckets closed for longer than a grace period are stored once fetched
+    and never fetched again, with the stored range only extended at either
+    end as requests need. The open bucket (the one containing now) and
+    buckets still in their grace period, which may yet get trades from the
+    ledgers closing them, are refetched at most once per refresh period
+    through the cache.
+
+    Only one request fetches buckets for an asset and resolution at a time.
+    Others serve whatever is already stored instead of waiting on it.
+    """
+    FETCH_LOCK_KEY = 'horizon:trade_aggregations:fetch:{0}:{1}'
+    RECENT_BUCKET_KEY = 'horizon:trade_aggregations:recent:{0}:{1}:{2}'
+    HORIZON_LIMIT = 200
+
+    def __init__(self, asset, resolution):
+        self.asset = asset
+        self.resolution = resolution
+
+    def _fetch(self, start, end):
+        """
+        Fetch all trade aggregation records in [start, end) from Horizon.
+        """
+        params = {
+            'base_asset_type': self.asset.type(),
+            'base_asset_code': self.asset.code,
+            'base_asset_issuer': self.asset.issuer_address,
+            'counter_asset_type': 'native',
+            'resolution': self.resolution,
+            'end_time': end,
+            'limit': self.HORIZON_LIMIT,
+            'order': 'asc',
+        }
+        url = '{0}/trade_aggregations'.format(settings.STELLAR_HORIZON)
+        records = []
+        while start < end:
+            params['start_time'] = start
+            page = fetchers.get_json(url, params=params)['_embedded']['records']
+            records.extend(page)
+            if len(page) < self.HORIZON_LIMIT:
+                break
+            start = int(page[-1]['timestamp']) + self.resolution
+        return records
+
+    def _fill(self, start, end):
+        """
+        Fetch and store closed buckets in [start, end) outside the stored range.
+        """
+        coverage = TradeAggregationCoverage.objects.filter(asset=self.asset,
+            resolution=self.resolution).first()
+        if coverage and (start > coverage.end or end < coverage.start):
+            # NOTE: Start a new stored range versus fetching everything in between
+            coverage = None
+
+        if coverage is None:
+            gaps = [ (start, end) ]
+        else:
+            # Fill up to the stored range so it stays contiguous
+            gaps = [ (start, coverage.start), (coverage.end, end) ]
+        gaps = [ (gap_start, gap_end) for gap_start, gap_end in gaps if gap_start < gap_end ]
+        if not gaps:
+            return
+
+        for gap_start, gap_end in gaps:
+            TradeAggregation.objects.store(self.asset, self.resolution, gap_start, gap_end,
+                self._fetch(gap_start, gap_end))
+
+        TradeAggregationCoverage.objects.update_or_create(asset=self.asset,
+            resolution=self.resolution, defaults={
+                'start': min(start, coverage.start) if coverage else start,
+                'end': max(end, coverage.end) if coverage else end,
+            })
+
+    def _recent_bucket(self, bucket_start):
+        """
+        Returns the open or grace period bucket record starting at
+        bucket_start, or None if it has no trades yet.
+        """
+        key = self.RECENT_BUCKET_KEY.format(self.asset.pk, self.resolution, bucket_start)
+        cached = cache.get(key)
+        if cached is None:
+            records = self._fetch(bucket_start, bucket_start + self.resolution)
+            cached = { 'record': records[0] if records else None }
+            cache.set(key, cached, settings.HORIZON_TRADE_AGGREGATION_OPEN_REFRESH)
+        return cached['record']
+
+    def get_records(self, start, end):
+        """
+        Returns list of Horizon trade aggregation records for buckets
+        starting in [start, end), all in milliseconds.
+        """
+        now = int(time.time() * 1000)
+        start -= start % self.resolution
+        open_start = now - now % self.resolution
+        settled = now - settings.HORIZON_TRADE_AGGREGATION_CLOSE_GRACE * 1000
+        settled_end = min(end, settled - settled % self.resolution)
+
+        if start < settled_end:
+            # NOTE: If another request is fetching, serve what's stored versus waiting on it
+            lock_key = self.FETCH_LOCK_KEY.format(self.asset.pk, self.resolution)
+            if cache.add(lock_key, True, settings.HORIZON_TRADE_AGGREGATION_FETCH_LOCK_TIMEOUT):
+                try:
+                    self._fill(start, settled_end)
+                except Exception as e:
+                    print 'Error occurred fetching trade aggregations for {0}: {1}'.format(self.asset, e)
+                finally:
+                    cache.delete(lock_key)
+
+        records = [ b.to_record() for b in TradeAggregation.objects.filter(asset=self.asset,
+            resolution=self.resolution, timestamp__gte=start, timestamp__lt=settled_end)\
+            .order_by('timestamp') ]
+
+        # Open and grace period buckets
+        bucket_start = max(start, settled_end)
+        while bucket_start <= open_start and bucket_start < end:
+            try:
+                record = self._recent_bucket(bucket_start)
+            except Exception as e:
+                print 'Error occurred fetching recent trade aggregation for {0}: {1}'.format(self.asset, e)
+                record = None
+            if record:
+                records.append(record)
+            bucket_start += self.resolution
+
+        return records
@@ -0,0 +1,63 @@
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_init, pre_save
+
+
+def _values(instance, fields):
+    """
+    Returns dict of { field name: value } for fields loaded on instance,
+    with files as their name.
+
+    NOTE: Reads from __dict__ so deferred fields aren't loaded.
+    """
+    values = {}
+    for name in fields:
+        attname = instance._meta.get_field(name).attname
+        if attname in instance.__dict__:
+            value = instance.__dict__[attname]
+            values[name] = value.name if isinstance(value, FieldFile) else value
+    return values
+
+
+def track(model, fields):
+    """
+    Track changes to the given fields of model instances, so post_save
+    receivers can check changed(instance, fields) before syncing.
+
+    Values are snapshot when an instance is loaded, and compared with those
+    being saved on pre_save. Connect after other pre_save receivers of the
+    model that set tracked fields.
+    """
+    fields = tuple(fields)
+
+    def snapshot(sender, instance, **kwargs):
+        instance._tracked_values = _values(instance, fields)
+
+    def diff(sender, instance, update_fields=None, **kwargs):
+        saved = fields if update_fields is None else\
+            [ name for name in fields if name in update_fields ]
+        values = _values(instance, saved)
+        tracked_values = getattr(instance, '_tracked_values', {})
+        if instance._state.adding:
+            instance._changed_fields = frozenset(fields)
+        else:
+            instance._changed_fields = frozenset([ name for name, value in values.items()
+                if name not in tracked_values or tracked_values[name] != value ])
+        tracked_values.update(values)
+        instance._tracked_values = tracked_values
+
+    post_init.connect(snapshot, sender=model, weak=False,
+        dispatch_uid='dirty.snapshot.{0}'.format(model._meta.label))
+    pre_save.connect(diff, sender=model, weak=False,
+        dispatch_uid='dirty.diff.{0}'.format(model._meta.label))
+
+
+def changed(instance, fields):
+    """
+    Whether any of the given fields changed in the instance's latest save.
+
+    True if the instance isn't tracked, so syncs aren't skipped by mistake.
+    """
+    changed_fields = getattr(instance, '_changed_fields', None)
+    if changed_fields is None:
+        return True
+    return not changed_fields.isdisjoint(fields)
@@ -0,0 +1,129 @@
+import requests, time
+
+from django.conf import settings
+
+from multiprocessing.pool import ThreadPool
+
+from stellar_base.utils import AccountNotExistError
+
+from . import instrumentation
+
+
+class TransientFetchError(Exception):
+    """
+    Raised when an upstream API responds with a status code that is
+    worth retrying (rate limited or server error).
+    """
+    pass
+
+
+def get(url, params=None, headers=None, timeout=None, retries=None):
+    """
+    GET the given url and return the response.
+
+    Retries with exponential backoff on connection errors, timeouts and
+    429/5xx responses. Once retries are exhausted, the last error is raised.
+    """
+    timeout = timeout if timeout is not None else settings.HORIZON_FETCH_TIMEOUT
+    retries = retries if retries is not None else settings.HORIZON_FETCH_RETRIES
+
+    attempt = 0
+    while True:
+        try:
+            with instrumentation.call(url):
+                r = requests.get(url, params=params, headers=headers, timeout=timeout)
+                if r.status_code == requests.codes.too_many_requests or r.status_code >= 500:
+                    raise TransientFetchError('{0} returned status {1}'.format(url, r.status_code))
+            return r
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+            TransientFetchError):
+            if attempt >= retries:
+                raise
+            time.sleep(settings.HORIZON_FETCH_BACKOFF * (2 ** attempt))
+            instrumentation.record_retry(url)
+            attempt += 1
+
+
+def get_json(url, params=None, timeout=None, retries=None):
+    """
+    GET the given url and return the parsed JSON response, retrying
+    as get() does.
+    """
+    return get(url, params=params, timeout=timeout, retries=retries).json()
+
+
+def map_concurrent(func, items, workers=None):
+    """
+    Apply func to each of the given items on a bounded pool of threads.
+
+    Returns a list of results in the same order as items. func should
+    handle its own exceptions, as any raised will abort the whole map.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    # Worker threads record call metrics to the caller's active job
+    recorder = instrumentation.current()
+    def _func(item):
+        with instrumentation.activate(recorder):
+            return func(item)
+
+    workers = workers or settings.HORIZON_FETCH_WORKERS
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(_func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def parse_balances(balances):
+    """
+    Returns compact tuple of (asset_id, balance) pairs for the given list
+    of Horizon account balance records.
+    """
+    return tuple(
+        ('{0}-{1}'.format(b['asset_code'], b['asset_issuer'])
+            if b['asset_type'] != 'native' else 'XLM-native', float(b['balance']))
+        for b in balances
+    )
+
+
+def fetch_account_balances(public_key):
+    """
+    Retrieve the balances for the given account from Horizon, as tuple of
+    (asset_id, balance) pairs.
+
+    Raises AccountNotExistError if the account doesn't exist on the
+    Stellar network.
+    """
+    url = '{0}/accounts/{1}'.format(settings.STELLAR_HORIZON, public_key)
+    json = get_json(url)
+    if json.get('status') == 404:
+        raise AccountNotExistError(json.get('title'))
+    elif 'balances' not in json:
+        raise Exception(json.get('detail'))
+    return parse_balances(json['balances'])
+
+
+def fetch_all_account_balances(public_keys, workers=None):
+    """
+    Concurrently retrieve balances from Horizon for each of the given
+    account public keys.
+
+    Returns dict of format { public_key: balances }, with balances
+    set to None if the account doesn't exist on the Stellar network.
+    Accounts that couldn't be loaded after retrying are left out of the dict.
+    """
+    def _fetch(public_key):
+        try:
+            return (public_key, fetch_account_balances(public_key))
+        except AccountNotExistError:
+            return (public_key, None)
+        except Exception as e:
+            print 'Error occurred fetching account {0}: {1}'.format(public_key, e)
+            return None
+
+    results = map_concurrent(_fetch, set(public_keys), workers=workers)
+    return dict(res for res in results if res is not None)
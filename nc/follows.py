@@ -0,0 +1,195 @@
+import bisect, time, uuid
+
+from array import array
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class FollowGraph(object):
+    """
+    Each user's following and follower ids as sorted int arrays in the
+    shared cache, so follow checks, counts and intersections are answered
+    in memory without touching the followers table.
+
+    Arrays are loaded from the db on a miss and updated incrementally from
+    the m2m_changed signal of Profile.followers once the change commits.
+
+    Each array is stored with the generation of its key it was loaded at,
+    and every update bumps the generation, even if the array isn't cached.
+    Arrays whose generation is outdated are treated as misses, so a reader
+    that loaded from the db before a follow committed can't store a stale
+    array over it. An update that can't take the key's lock in time only
+    marks the key stale and bumps the generation, so the next read reloads
+    it, and the lock holder drops what it stored if it sees the mark.
+
+    NOTE: For display only. Writes and privacy checks should read the db.
+    """
+    FOLLOWING_KEY = 'follow:following:{0}'
+    FOLLOWERS_KEY = 'follow:followers:{0}'
+    GENERATION_KEY = 'follow:generation:{0}'
+    STALE_KEY = 'follow:stale:{0}'
+    LOCK_KEY = 'follow:lock:{0}'
+
+    def _load(self, key, user_id):
+        """
+        Returns sorted array of ids for key from the db.
+        """
+        through = apps.get_model('nc', 'Profile').followers.through
+        if key == self.FOLLOWING_KEY:
+            ids = through.objects.filter(user_id=user_id).values_list('profile_id', flat=True)
+        else:
+            ids = through.objects.filter(profile_id=user_id).values_list('user_id', flat=True)
+        return array('i', sorted(ids))
+
+    def _generation(self, cache_key):
+        """
+        Returns the current generation of cache_key, starting it if missing.
+        """
+        generation_key = self.GENERATION_KEY.format(cache_key)
+        generation = cache.get(generation_key)
+        if generation is None:
+            # NOTE: Another process may have set it first, so reread
+            cache.add(generation_key, uuid.uuid4().hex, settings.FOLLOW_GRAPH_CACHE_TIMEOUT)
+            generation = cache.get(generation_key)
+        return generation
+
+    def _bump_generation(self, cache_key):
+        generation = uuid.uuid4().hex
+        cache.set(self.GENERATION_KEY.format(cache_key), generation,
+            settings.FOLLOW_GRAPH_CACHE_TIMEOUT)
+        return generation
+
+    def _ids(self, key, user_id):
+        cache_key = key.format(user_id)
+        generation_key = self.GENERATION_KEY.format(cache_key)
+        cached = cache.get_many([ cache_key, generation_key ])
+        entry = cached.get(cache_key)
+        if entry is not None and cached.get(generation_key) is not None\
+            and entry[0] == cached[generation_key]:
+            return entry[1]
+
+        # Load at the current generation, so the entry is ignored if an
+        # update bumps it before or after storing
+        generation = cached.get(generation_key) or self._generation(cache_key)
+        ids = self._load(key, user_id)
+        cache.set(cache_key, (generation, ids), settings.FOLLOW_GRAPH_CACHE_TIMEOUT)
+        return ids
+
+    def following_ids(self, user_id):
+        """
+        Returns sorted array of ids of users user_id follows.
+        """
+        return self._ids(self.FOLLOWING_KEY, user_id)
+
+    def follower_ids(self, user_id):
+        """
+        Returns sorted array of ids of users following user_id.
+        """
+        return self._ids(self.FOLLOWERS_KEY, user_id)
+
+    def following_count(self, user_id):
+        return len(self.following_ids(user_id))
+
+    def followers_count(self, user_id):
+        return len(self.follower_ids(user_id))
+
+    def is_following(self, user_id, target_id):
+        """
+        Returns whether user_id follows target_id.
+        """
+        if not user_id:
+            return False
+        ids = self.following_ids(user_id)
+        i = bisect.bisect_left(ids, target_id)
+        return i < len(ids) and ids[i] == target_id
+
+    @staticmethod
+    def intersect(a, b):
+        """
+        Returns sorted list of ids in both sorted arrays a and b.
+        """
+        if len(a) > len(b):
+            a, b = b, a
+        ids = []
+        lo = 0
+        for id in a:
+            lo = bisect.bisect_left(b, id, lo)
+            if lo == len(b):
+                break
+            if b[lo] == id:
+                ids.append(id)
+        return ids
+
+    def followers_followed_by(self, user_id, target_id):
+        """
+        Returns sorted list of ids of target_id's followers that user_id follows.
+        """
+        if not user_id:
+            return []
+        return self.intersect(self.following_ids(user_id), self.follower_ids(target_id))
+
+    def _update(self, key, user_id, added, removed):
+        """
+        Bump the generation for key, inserting added ids into and dropping
+        removed ids from the cached array if it's current.
+        """
+        cache_key = key.format(user_id)
+        lock_key = self.LOCK_KEY.format(cache_key)
+        waited = 0.0
+        locked = cache.add(lock_key, True, settings.FOLLOW_GRAPH_LOCK_TIMEOUT)
+        while not locked and waited < settings.FOLLOW_GRAPH_LOCK_TIMEOUT:
+            time.sleep(0.05)
+            waited += 0.05
+            locked = cache.add(lock_key, True, settings.FOLLOW_GRAPH_LOCK_TIMEOUT)
+        if not locked:
+            cache.set(self.STALE_KEY.format(cache_key), True, 2 * settings.FOLLOW_GRAPH_LOCK_TIMEOUT)
+            self._bump_generation(cache_key)
+            return
+
+        try:
+            generation_key = self.GENERATION_KEY.format(cache_key)
+            cached = cache.get_many([ cache_key, generation_key ])
+            entry = cached.get(cache_key)
+            generation = self._bump_generation(cache_key)
+            if entry is None or cached.get(generation_key) is None\
+                or entry[0] != cached[generation_key]:
+                return
+
+            ids = entry[1]
+            for id in added:
+                i = bisect.bisect_left(ids, id)
+                if i == len(ids) or ids[i] != id:
+                    ids.insert(i, id)
+            for id in removed:
+                i = bisect.bisect_left(ids, id)
+                if i < len(ids) and ids[i] == id:
+                    ids.pop(i)
+            cache.set(cache_key, (generation, ids), settings.FOLLOW_GRAPH_CACHE_TIMEOUT)
+
+            # An update that couldn't wait for the lock may have been missed
+            if cache.get(self.STALE_KEY.format(cache_key)):
+                self._bump_generation(cache_key)
+        finally:
+            cache.delete(lock_key)
+
+    def _apply(self, edges, follow):
+        for follower_id, target_id in edges:
+            added, removed = ([ target_id ], []) if follow else ([], [ target_id ])
+            self._update(self.FOLLOWING_KEY, follower_id, added, removed)
+            added, removed = ([ follower_id ], []) if follow else ([], [ follower_id ])
+            self._update(self.FOLLOWERS_KEY, target_id, added, removed)
+
+    def apply(self, edges, follow):
+        """
+        Add (follow=True) or remove the (follower_id, target_id) edges once
+        the current transaction commits.
+        """
+        edges = list(edges)
+        if edges:
+            transaction.on_commit(lambda: self._apply(edges, follow))
+
+
+graph = FollowGraph()
@@ -28,6 +28,7 @@ from stellar_base.utils import AccountNotExistError
 
 from stream_django.feed_manager import feed_manager
 
+from . import registry
 from .models import Account, Asset, Profile, AccountFundRequest
 
 
@@ -70,7 +71,20 @@ class UserUpdateForm(forms.ModelForm):
         }
 
 
-class ProfileUpdateForm(forms.ModelForm):
+class ProfileFieldsSaveMixin(object):
+    """
+    Save only the form's fields on the profile, so columns updated
+    elsewhere (e.g. followers_count) aren't written back stale.
+    """
+    def save(self, commit=True):
+        profile = super(ProfileFieldsSaveMixin, self).save(commit=False)
+        if commit:
+            profile.save(update_fields=self._meta.fields)
+            self._save_m2m()
+        return profile
+
+
+class ProfileUpdateForm(ProfileFieldsSaveMixin, forms.ModelForm):
     class Meta:
         model = Profile
         fields = [ 'bio', 'pic', 'cover' ]
@@ -79,7 +93,7 @@ class ProfileUpdateForm(forms.ModelForm):
         }
 
 
-class ProfileWithPrivacyUpdateForm(forms.ModelForm):
+class ProfileWithPrivacyUpdateForm(ProfileFieldsSaveMixin, forms.ModelForm):
     class Meta:
         model = Profile
         fields = [ 'bio', 'pic', 'cover', 'is_private' ]
@@ -108,7 +122,7 @@ class UserProfileWithPrivacyUpdateMultiForm(multiform.MultiModelForm):
     ))
 
 
-class ProfileEmailSettingsUpdateForm(forms.ModelForm):
+class ProfileEmailSettingsUpdateForm(ProfileFieldsSaveMixin, forms.ModelForm):
     class Meta:
         model = Profile
         fields = [ 'allow_payment_email', 'allow_token_issuance_email', 'allow_trust_email',
@@ -129,7 +143,7 @@ class ProfileEmailSettingsUpdateForm(forms.ModelForm):
         }
 
 
-class ProfilePrivacySettingsUpdateForm(forms.ModelForm):
+class ProfilePrivacySettingsUpdateForm(ProfileFieldsSaveMixin, forms.ModelForm):
     class Meta:
         model = Profile
         fields = [ 'is_private' ]
@@ -334,7 +348,7 @@ class AccountCreateForm(forms.ModelForm):
             self.account_user = user_funding
             profile_funding = user_funding.profile
             profile_funding.accounts_created += 1
-            profile_funding.save()
+            profile_funding.save(update_fields=['accounts_created'])
 
             # Delete the funding request
             funding_request.delete()
@@ -529,12 +543,9 @@ class FeedActivityCreateForm(forms.Form):
             object_href = object_profile.href() if object_profile else None
 
             # Get the details of asset sent if registered in our db
-            try:
-                asset_id = '{0}-{1}'.format(record['asset_code'], record['asset_issuer'])\
-                    if record['asset_type'] != 'native' else 'XLM-native'
-                asset = Asset.objects.get(asset_id=asset_id)
-            except ObjectDoesNotExist:
-                asset = None
+            asset_id = '{0}-{1}'.format(record['asset_code'], record['asset_issuer'])\
+                if record['asset_type'] != 'native' else 'XLM-native'
+            asset = registry.assets.get(asset_id)
             asset_pic_url = asset.pic_url() if asset else None
             asset_href = asset.href() if asset else None
 
@@ -1,12 +1,167 @@
+import algoliasearch_django, threading
+
+from datetime import timedelta
+
 from algoliasearch_django import algolia_engine, AlgoliaIndex
+from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from . import dirty
+
+
+def save_records(model, instances, batch_size=1000):
+    """
+    Save search index records of the given model instances in batches,
+    versus one request per instance as on post_save.
+    """
+    adapter = algoliasearch_django.get_adapter(model)
+    algolia_index = algolia_engine.client.init_index(adapter.index_name)
+    records = [ adapter.get_raw_record(instance) for instance in instances ]
+    for i in range(0, len(records), batch_size):
+        algolia_index.save_objects(records[i:i + batch_size])
+
+
+def partial_update_records(model, records, batch_size=1000):
+    """
+    Partially update search index records of the given model in batches,
+    with records a list of dicts each including the objectID.
+    """
+    adapter = algoliasearch_django.get_adapter(model)
+    algolia_index = algolia_engine.client.init_index(adapter.index_name)
+    for i in range(0, len(records), batch_size):
+        algolia_index.partial_update_objects(records[i:i + batch_size])
+
+
+class FollowerIndexSync(object):
+    """
+    Pushes follower changes to the search index in batches.
+
+    Each follow and unfollow is stored as a FollowerIndexDelta in the same
+    transaction. The first change in a window schedules a flush at the end
+    of the window, which reschedules itself while deltas remain. The flush coalesces the pending deltas per (follower,
+    profile) into one batch of partial updates. These set followers_count
+    on ProfileIndex and add or remove the follower in viewable_by_if_private
+    on AccountIndex.
+    """
+    SCHEDULE_KEY = 'algolia:followers:flush:scheduled'
+    FLUSH_LOCK_KEY = 'algolia:followers:flush:lock'
+
+    def schedule(self):
+        """
+        Flush pending deltas at the end of the window once the current
+        transaction commits, unless a flush is already scheduled.
+        """
+        transaction.on_commit(self._schedule)
+
+    def _schedule(self):
+        # NOTE: Key outlives the window so a flush lost with its process is
+        # rescheduled by a later change
+        if cache.add(self.SCHEDULE_KEY, True, 2 * settings.ALGOLIA_FOLLOWER_SYNC_WINDOW):
+            timer = threading.Timer(settings.ALGOLIA_FOLLOWER_SYNC_WINDOW, self._flush_scheduled)
+            timer.daemon = True
+            timer.start()
+
+    def _flush_scheduled(self):
+        try:
+            # Clear first so changes made during the flush schedule the next one
+            cache.delete(self.SCHEDULE_KEY)
+            self.flush()
+        except Exception as e:
+            print 'Error occurred flushing follower index deltas: {0}'.format(e)
+
+        try:
+            # Deltas left by a concurrent flush holding the lock, or by a failed
+            # push, are flushed at the end of the next window
+            FollowerIndexDelta = apps.get_model('nc', 'FollowerIndexDelta')
+            if FollowerIndexDelta.objects.exists():
+                self._schedule()
+        finally:
+            connection.close()
+
+    def sweep(self):
+        """
+        Flush deltas older than a couple of windows, in case the process that
+        scheduled their flush died. Run from the worker cron.
+
+        Returns number of deltas pushed.
+        """
+        FollowerIndexDelta = apps.get_model('nc', 'FollowerIndexDelta')
+        older_than = timezone.now() - timedelta(seconds=2 * settings.ALGOLIA_FOLLOWER_SYNC_WINDOW)
+        if not FollowerIndexDelta.objects.filter(created__lt=older_than).exists():
+            return 0
+        return self.flush()
+
+    def flush(self):
+        """
+        Push all pending deltas to the search index, deleting them once pushed.
+
+        Returns number of deltas pushed.
+        """
+        if not cache.add(self.FLUSH_LOCK_KEY, True, settings.ALGOLIA_FOLLOWER_SYNC_LOCK_TIMEOUT):
+            return 0
+
+        try:
+            FollowerIndexDelta = apps.get_model('nc', 'FollowerIndexDelta')
+            deltas = list(FollowerIndexDelta.objects.all())
+            if not deltas:
+                return 0
+            latest = FollowerIndexDelta.objects.coalesce(deltas)
+            profile_ids = set([ profile_id for follower_id, profile_id in latest.keys() ])
+
+            # Current counts for profiles, versus applying deltas to the index
+            Profile = apps.get_model('nc', 'Profile')
+            profile_records = [ { 'objectID': pk, 'followers_count': followers_count }
+                for pk, followers_count in Profile.objects.filter(pk__in=profile_ids)\
+                    .values_list('pk', 'followers_count') ]
+
+            Account = apps.get_model('nc', 'Account')
+            account_pks = {}
+            for pk, user_id in Account.objects.filter(user_id__in=profile_ids)\
+                .values_list('pk', 'user_id'):
+                account_pks.setdefault(user_id, []).append(pk)
+            account_records = [
+                { 'objectID': account_pk, 'viewable_by_if_private': {
+                    '_operation': 'AddUnique' if followed else 'Remove',
+                    'value': follower_id,
+                } }
+                for (follower_id, profile_id), followed in latest.items()
+                for account_pk in account_pks.get(profile_id, [])
+            ]
+
+            batch_size = settings.ALGOLIA_FOLLOWER_SYNC_BATCH_SIZE
+            partial_update_records(Profile, profile_records, batch_size)
+            partial_update_records(Account, account_records, batch_size)
+
+            FollowerIndexDelta.objects.filter(id__in=[ d.id for d in deltas ]).delete()
+            return len(deltas)
+        finally:
+            cache.delete(self.FLUSH_LOCK_KEY)
+
+
+follower_sync = FollowerIndexSync()
 
 
 class SecuredAlgoliaIndex(AlgoliaIndex):
     """
     Override AlgoliaIndex to include method that produces
     secured search API key based on index's privacy requirements.
+
+    Also skips the record save on post_save unless one of tracked_fields,
+    the model fields the record is built from, changed (see signals.py).
     """
+    tracked_fields = ()
+
+    def save_record(self, instance, update_fields=None, **kwargs):
+        if kwargs.get('signal') is post_save and self.tracked_fields\
+            and not dirty.changed(instance, self.tracked_fields):
+            return
+        super(SecuredAlgoliaIndex, self).save_record(instance,
+            update_fields=update_fields, **kwargs)
+
     def get_secured_query_params(self, request):
         """
         Returns query params to use in generation of secured
@@ -26,6 +181,7 @@ class SecuredAlgoliaIndex(AlgoliaIndex):
 
 class ProfileIndex(SecuredAlgoliaIndex):
     fields = ('username', 'full_name', 'pic_url', 'href', 'bio', 'followers_count')
+    tracked_fields = ('user', 'full_name', 'pic', 'bio', 'followers_count')
     settings = {
         'searchableAttributes': ['username', 'full_name', 'bio'],
         'customRanking': ['desc(followers_count)'],
@@ -37,6 +193,7 @@ class ProfileIndex(SecuredAlgoliaIndex):
 class AccountIndex(SecuredAlgoliaIndex):
     fields = ('public_key', 'username', 'name', 'pic_url', 'href', 'user_full_name',
         'user_pic_url', 'profile_is_private', 'viewable_by_if_private')
+    tracked_fields = ('public_key', 'user', 'name', 'pic', 'user_full_name', 'user_pic_url')
     settings = {
         'searchableAttributes': ['public_key', 'username', 'user_full_name', 'name'],
         'attributesForFaceting': ['profile_is_private', 'viewable_by_if_private'],
@@ -59,6 +216,7 @@ class AccountIndex(SecuredAlgoliaIndex):
 
 class AssetIndex(SecuredAlgoliaIndex):
     fields = ('code', 'issuer_address', 'issuer_handle', 'domain', 'pic_url', 'href')
+    tracked_fields = ('code', 'issuer', 'issuer_address', 'asset_id', 'domain', 'pic', 'toml_pic')
     settings = {
         'searchableAttributes': ['code', 'domain', 'issuer_handle', 'issuer_address'],
         'highlightPreTag': '<mark>',
@@ -0,0 +1,175 @@
+import bisect, json, threading, time, urlparse
+
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils import timezone
+
+
+_local = threading.local()
+
+
+class JobRecorder(object):
+    """
+    Collects timings for the phases of a cron job run along with per-call
+    latency histograms and error, retry counts for the external services
+    it calls.
+
+    Phases may nest, in which case time is only attributed to the
+    innermost phase. Calls may be recorded from any thread.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.started = timezone.now()
+        self.phases = {}
+        self.calls = {}
+        self.job_run = None
+        self._stack = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the enclosed block, adding to the total for the given phase.
+        """
+        frame = [name, time.time(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.time() - frame[1]
+            if self._stack:
+                # Exclude nested time from the parent phase
+                self._stack[-1][2] += elapsed
+
+            stats = self.phases.setdefault(name, { 'seconds': 0.0, 'count': 0 })
+            stats['seconds'] += elapsed - frame[2]
+            stats['count'] += 1
+
+    def _service_stats(self, service):
+        return self.calls.setdefault(service, {
+            'count': 0, 'errors': 0, 'retries': 0, 'seconds': 0.0,
+            'max_seconds': 0.0,
+            'histogram': [ 0 ] * (len(settings.JOB_METRICS_LATENCY_BUCKETS) + 1),
+        })
+
+    def record_call(self, service, seconds, error=False):
+        """
+        Record a single call to the given service taking seconds.
+        """
+        buckets = settings.JOB_METRICS_LATENCY_BUCKETS
+        with self._lock:
+            stats = self._service_stats(service)
+            stats['count'] += 1
+            stats['errors'] += int(error)
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['histogram'][bisect.bisect_left(buckets, seconds)] += 1
+
+    def record_retry(self, service):
+        """
+        Count a retry of a failed call to the given service.
+        """
+        with self._lock:
+            self._service_stats(service)['retries'] += 1
+
+    def get_metrics(self):
+        """
+        Returns dict of call metrics by service, with histogram bucket
+        counts keyed by upper bound in seconds.
+        """
+        labels = [ '<={0}'.format(b) for b in settings.JOB_METRICS_LATENCY_BUCKETS ] + [ '+Inf' ]
+        with self._lock:
+            return {
+                service: dict(stats, histogram=dict(zip(labels, stats['histogram'])))
+                for service, stats in self.calls.iteritems()
+            }
+
+
+def current():
+    """
+    Returns the JobRecorder active on this thread, if any.
+    """
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def activate(recorder):
+    """
+    Make the given recorder the active one on this thread, e.g. for
+    worker threads of a job.
+    """
+    previous = current()
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+@contextmanager
+def job(name, worker=None):
+    """
+    Record the enclosed block as a run of the job with the given name,
+    saving a JobRun with its phases and call metrics on exit as the
+    recorder's job_run.
+    """
+    from .models import JobRun
+
+    recorder = JobRecorder(name)
+    error = None
+    try:
+        with activate(recorder):
+            yield recorder
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        try:
+            recorder.job_run = JobRun.objects.create(name=name, worker=worker,
+                started=recorder.started, finished=timezone.now(),
+                phases=json.dumps(recorder.phases),
+                metrics=json.dumps(recorder.get_metrics()), error=error)
+        except Exception as e:
+            print 'Error occurred saving {0} job run: {1}'.format(name, e)
+
+
+@contextmanager
+def phase(name):
+    """
+    Time the enclosed block as a phase of the active job, if any.
+    """
+    recorder = current()
+    if recorder is None:
+        yield
+    else:
+        with recorder.phase(name):
+            yield
+
+
+@contextmanager
+def call(url):
+    """
+    Record the latency of the enclosed call to url for the active job, if
+    any, keyed by host. Exceptions raised count as errors.
+    """
+    recorder = current()
+    start = time.time()
+    try:
+        yield
+    except Exception:
+        if recorder:
+            recorder.record_call(urlparse.urlparse(url).netloc, time.time() - start, error=True)
+        raise
+    else:
+        if recorder:
+            recorder.record_call(urlparse.urlparse(url).netloc, time.time() - start)
+
+
+def record_retry(url):
+    """
+    Count a retry of a failed call to url for the active job, if any.
+    """
+    recorder = current()
+    if recorder:
+        recorder.record_retry(urlparse.urlparse(url).netloc)
@@ -0,0 +1,81 @@
+import json, time
+
+from django.conf import settings
+
+from sseclient import SSEClient
+
+from .models import Account, LedgerCursor
+
+
+class LedgerStreamConsumer(object):
+    """
+    Follows the Horizon effects stream, flagging stored balances of
+    registered accounts as stale when they have activity on the
+    Stellar network.
+
+    Flags and the stream cursor are flushed to the db together every
+    flush interval, so after a restart the consumer resumes from the last
+    flushed event and at worst flags an account twice.
+    """
+    def __init__(self, name=None):
+        self.name = name or settings.LEDGER_STREAM_CURSOR_NAME
+        self.public_keys = set()
+        self.changed_public_keys = set()
+        self.paging_token = None
+        self.accounts_refreshed = 0
+        self.flushed = 0
+
+    def _stream_url(self, cursor):
+        return '{0}/effects?cursor={1}'.format(settings.STELLAR_HORIZON, cursor)
+
+    def _refresh_public_keys(self):
+        """
+        Reload the set of public keys registered with us.
+        """
+        self.public_keys = set(Account.objects.values_list('public_key', flat=True))
+        self.accounts_refreshed = time.time()
+
+    def flush(self):
+        """
+        Flag accounts with activity and save the cursor.
+        """
+        if self.changed_public_keys:
+            Account.objects.mark_balances_changed(self.changed_public_keys)
+            self.changed_public_keys = set()
+        if self.paging_token:
+            LedgerCursor.objects.update_or_create(name=self.name,
+                defaults={ 'paging_token': self.paging_token })
+        self.flushed = time.time()
+
+    def process(self, effect):
+        """
+        Process a single effect from the stream.
+        """
+        if effect.get('account') in self.public_keys:
+            self.changed_public_keys.add(effect['account'])
+        self.paging_token = effect.get('paging_token', self.paging_token)
+
+    def run(self):
+        """
+        Consume the effects stream indefinitely, reconnecting from the
+        stored cursor on errors.
+        """
+        while True:
+            cursor = LedgerCursor.objects.filter(name=self.name)\
+                .values_list('paging_token', flat=True).first() or 'now'
+            try:
+                for message in SSEClient(self._stream_url(cursor)):
+                    now = time.time()
+                    if now - self.accounts_refreshed >= settings.LEDGER_STREAM_ACCOUNTS_REFRESH:
+                        self._refresh_public_keys()
+
+                    # NOTE: Horizon sends "hello" on connect
+                    if message.data and message.data != '"hello"':
+                        self.process(json.loads(message.data))
+
+                    if now - self.flushed >= settings.LEDGER_STREAM_FLUSH_INTERVAL:
+                        self.flush()
+            except Exception as e:
+                print 'Error occurred streaming effects from {0}: {1}'.format(cursor, e)
+                self.flush()
+                time.sleep(settings.LEDGER_STREAM_RECONNECT_BACKOFF)
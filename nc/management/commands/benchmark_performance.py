@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+
+from nc import benchmarks
+from nc.views import PerformanceCreateView
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the performance cron pipeline against a fake Horizon'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000',
+            help='Comma separated numbers of users to benchmark')
+        parser.add_argument('--accounts', type=int, default=2,
+            help='Accounts per user')
+        parser.add_argument('--assets', type=int, default=50,
+            help='Number of non-native assets')
+        parser.add_argument('--latency', type=float, default=50.0,
+            help='Fake Horizon response latency in milliseconds')
+
+    def handle(self, *args, **options):
+        """
+        Management command to seed users, accounts and assets at each of
+        the given sizes and time each phase of the performance cron job,
+        with Horizon and StellarTerm served by a local stand-in server.
+
+        Runs against a test database created for the benchmark and destroyed
+        after, like the test runner, so the configured database (production
+        on deployed environments) is never read or locked.
+        Fails if any phase exceeds its query count or time threshold.
+        """
+        performance_view = PerformanceCreateView()
+        latency = options['latency'] / 1000.0
+
+        violations = []
+        old_config = setup_databases(options['verbosity'], interactive=False)
+        try:
+            for size in [ int(s) for s in options['sizes'].split(',') ]:
+                results, metrics, size_violations = benchmarks.run(performance_view,
+                    size, options['accounts'], options['assets'], latency=latency)
+
+                print 'Benchmark for {0} users, {1} accounts, {2} assets ({3} ms latency)'.format(
+                    size, size * options['accounts'], options['assets'], options['latency'])
+                for name in [ 'prices', 'record_values', 'performance_stats', 'rank' ]:
+                    stats = results[name]
+                    print '  {0}: {1:.3f} seconds, {2} queries, {3} KB peak memory growth'.format(
+                        name, stats['seconds'], stats['queries'], stats['maxrss_growth'])
+                for host, stats in sorted(metrics.items()):
+                    print '  {0}: {1} calls, {2} errors, {3} retries, {4:.3f} max seconds'.format(
+                        host, stats['count'], stats['errors'], stats['retries'], stats['max_seconds'])
+
+                violations.extend([ '{0} users: {1}'.format(size, v) for v in size_violations ])
+        finally:
+            teardown_databases(old_config, options['verbosity'])
+
+        if violations:
+            raise CommandError('Thresholds exceeded:\n' + '\n'.join(violations))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from nc.views import PerformanceCreateView
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        """
+        Management command to roll up raw portfolio data into hour/day/month
+        aggregates and delete raw data older than the retention period.
+
+        Normally run by the performance cron job once a run is ranked.
+        """
+        performance_view = PerformanceCreateView()
+
+        # Keep track of the time compaction takes for performance reasons
+        start = timezone.now()
+        rolled_up, deleted = performance_view._compact_portfolio_data()
+
+        duration = timezone.now() - start
+        print 'Portfolio data compaction took {0} seconds: {1} rolled up, {2} deleted'.format(
+            duration.total_seconds(), rolled_up, deleted)
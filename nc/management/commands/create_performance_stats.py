@@ -12,32 +12,35 @@ class Command(BaseCommand):
         Management command to simulate (for testing) daily cron job task of
         storing performance related data for all profile portfolios
         in our db.
+
+        Multiple instances of this command can run at the same time, with
+        each claiming separate shards of the portfolios.
         """
         performance_view = PerformanceCreateView()
 
         # Keep track of the time cron job takes for performance reasons
         cron_start = timezone.now()
 
-        # Get asset prices
-        asset_prices = performance_view._assemble_asset_prices()
-
-        # Bulk create portfolio value time series records for all accounts in db
-        performance_view._record_portfolio_values(asset_prices)
-
-        # For all profiles in db, recalculate performance stats
-        performance_view._recalculate_performance_stats()
-
-        # Update rank values of top performing users.
-        performance_view._update_rank_values()
+        # Record portfolio values for shards of portfolios this worker claims.
+        # Performance stats and rank values are updated by the worker
+        # that completes the last shard of a run.
+        shard_count = performance_view._process_performance_runs()
 
         # Print out length of time cron took
         cron_duration = timezone.now() - cron_start
-        print 'Performance create cron job took {0} seconds for {1} assets and {2} portfolios'.format(
+        print 'Performance create cron job took {0} seconds for {1} shards, {2} assets and {3} portfolios'.format(
             cron_duration.total_seconds(),
+            shard_count,
             Asset.objects.count(),
             Portfolio.objects.count()
         )
 
+        # Print out time spent in each phase, as recorded to this run's JobRun
+        job_run = performance_view.job_run
+        if job_run:
+            for phase, stats in sorted(job_run.to_dict()['phases'].items()):
+                print '  {0}: {1} seconds'.format(phase, stats['seconds'])
+
         # Print out new rankings of top performers
         for p in Portfolio.objects.exclude(rank=None)\
             .prefetch_related('profile__user').order_by('rank'):
@@ -3,20 +3,48 @@ import requests
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
+from nc import index, registry
 from nc.models import Account, Asset
+from nc.ticker import TickerService
 
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument('--bulk', action='store_true',
+            help='Sync the whole catalogue with batched writes and search index updates')
+        parser.add_argument('--batch-size', type=int, default=500,
+            help='Assets written or indexed per batch in bulk mode')
+
+    def _sync_catalogue(self, batch_size):
+        """
+        Create or update all assets on the StellarTerm ticker with batched
+        writes, then save search records of just the updated assets in
+        batches.
+        """
+        ticker = TickerService().get()
+        created, updated = Asset.objects.sync_catalogue(ticker.assets.itervalues(),
+            batch_size=batch_size)
+        print 'Created {0} new assets in the db'.format(len(created))
+
+        updated_ids = [ a.id for a in updated ]
+        for i in range(0, len(updated_ids), batch_size):
+            index.save_records(Asset, Asset.objects.select_related('issuer__user')\
+                .filter(id__in=updated_ids[i:i + batch_size]), batch_size=batch_size)
+        print 'Updated {0} assets in the db'.format(len(updated))
+
     def handle(self, *args, **options):
         """
         Management command to fetch assets from known Stellar registeries
         (StellarTerm for now) to initially populate our db with assets.
         """
+        if options['bulk']:
+            self._sync_catalogue(options['batch_size'])
+            return
+
         # Accumulate asset_ids that are already in our db
-        existing_asset_ids = [
-            a.asset_id for a in Asset.objects.exclude(asset_id=None)
-        ]
+        existing_asset_ids = set(Asset.objects.exclude(asset_id=None)\
+            .values_list('asset_id', flat=True))
 
         # Fetch the StellarTerm assets json
         r = requests.get(settings.STELLARTERM_TICKER_URL)
@@ -59,10 +87,11 @@ class Command(BaseCommand):
 
         # Update assets already in our db
         update_count = 0
-        for model_asset in Asset.objects.filter(asset_id__in=[ k for k in fetched_assets_to_update ]):
-            a = fetched_assets_to_update[model_asset.asset_id]
-            model_asset.domain = a['domain']
-            model_asset.toml = "https://{0}{1}".format(a['domain'], settings.STELLAR_TOML_PATH)
-            model_asset.save()
-            update_count += 1
+        with registry.assets.batch():
+            for model_asset in Asset.objects.filter(asset_id__in=[ k for k in fetched_assets_to_update ]):
+                a = fetched_assets_to_update[model_asset.asset_id]
+                model_asset.domain = a['domain']
+                model_asset.toml = "https://{0}{1}".format(a['domain'], settings.STELLAR_TOML_PATH)
+                model_asset.save()
+                update_count += 1
         print 'Updated {0} assets in the db'.format(update_count)
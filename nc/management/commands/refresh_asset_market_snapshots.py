@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from nc.views import AssetMarketSnapshotUpdateView
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        """
+        For each asset in the StellarTerm ticker, refresh its market snapshot.
+        """
+        market_view = AssetMarketSnapshotUpdateView()
+
+        # Keep track of the time cron job takes for performance reasons
+        cron_start = timezone.now()
+
+        # For all assets in ticker, refresh market snapshot
+        count = market_view._refresh_market_snapshots()
+
+        # Print out length of time cron took
+        cron_duration = timezone.now() - cron_start
+        print 'Asset market snapshot cron job took {0} seconds for {1} assets'.format(
+            cron_duration.total_seconds(), count)
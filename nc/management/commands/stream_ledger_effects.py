@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from nc.ledger import LedgerStreamConsumer
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        """
+        Long-running management command to follow the Horizon effects
+        stream and flag registered accounts with activity, so the
+        performance cron only fetches changed account balances.
+        """
+        LedgerStreamConsumer().run()
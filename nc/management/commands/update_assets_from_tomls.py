@@ -26,3 +26,9 @@ class Command(BaseCommand):
             cron_duration.total_seconds(),
             Asset.objects.count()
         )
+
+        # Print out time spent in each phase, as recorded to this run's JobRun
+        job_run = asset_toml_view.job_run
+        if job_run:
+            for phase, stats in sorted(job_run.to_dict()['phases'].items()):
+                print '  {0}: {1} seconds'.format(phase, stats['seconds'])
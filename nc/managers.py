@@ -1,5 +1,91 @@
+import json
+
 from algoliasearch_django import update_records
-from django.db import models
+from bulk_update.helper import bulk_update
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from . import registry
+
+
+class ProfileManager(models.Manager):
+    def change_followers_count(self, deltas):
+        """
+        Atomically add to followers_count of profiles, with deltas a dict
+        of format { profile_id: delta }.
+
+        NOTE: Update versus save so ProfileIndex isn't pushed on every follow.
+        """
+        pks_by_delta = {}
+        for profile_id, delta in deltas.items():
+            if delta:
+                pks_by_delta.setdefault(delta, []).append(profile_id)
+        for delta, pks in pks_by_delta.items():
+            self.filter(pk__in=pks).update(followers_count=F('followers_count') + delta)
+
+
+class FollowerIndexDeltaManager(models.Manager):
+    def record(self, edges, followed):
+        """
+        Store (follower_id, profile_id) edges added (followed=True) or removed
+        for the next push to the search index.
+        """
+        self.bulk_create([
+            self.model(follower_id=follower_id, profile_id=profile_id, followed=followed)
+            for follower_id, profile_id in edges
+        ])
+
+    def coalesce(self, deltas):
+        """
+        Returns dict of format { (follower_id, profile_id): followed } with
+        the last change of each edge in deltas.
+        """
+        latest = {}
+        for delta in sorted(deltas, key=lambda d: d.id):
+            latest[(delta.follower_id, delta.profile_id)] = delta.followed
+        return latest
+
+
+class AccountManager(models.Manager):
+    def mark_balances_changed(self, public_keys):
+        """
+        Flag stored balances as stale for accounts with the given public keys,
+        after activity on the Stellar network.
+        """
+        return self.filter(public_key__in=public_keys)\
+            .update(balances_version=F('balances_version') + 1)
+
+    def set_balances_synced(self, accounts, updated):
+        """
+        Record balances of the given accounts as stored at the
+        balances_version each account had when they were fetched.
+        """
+        for account in accounts:
+            account.balances_synced_version = account.balances_version
+            account.balances_updated = updated
+        bulk_update(accounts, update_fields=['balances_synced_version', 'balances_updated'])
+
+
+class AccountBalanceManager(models.Manager):
+    def replace(self, account_balances):
+        """
+        Replace the stored balances of accounts with those given.
+
+        account_balances is dict of format { account_id: ((asset_id, balance), ...) }.
+        """
+        if not account_balances:
+            return
+        self.filter(account_id__in=account_balances.keys()).delete()
+        self.bulk_create([
+            self.model(account_id=account_id, asset_id=asset_id, balance=balance)
+            for account_id, balances in account_balances.iteritems()
+            for asset_id, balance in balances
+        ])
 
 
 class AssetManager(models.Manager):
@@ -13,6 +99,7 @@ class AssetManager(models.Manager):
             issuer = asset.issuer_address if asset.issuer_address else 'native'
             asset.asset_id = '{0}-{1}'.format(asset.code, issuer)
         created = super(AssetManager, self).bulk_create(objs, batch_size)
+        registry.assets.invalidate()
 
         # TODO: Figure out how to bulk create search index records. Until then,
         # rely on issuer editing asset page for asset pic/banner/color/verified
@@ -20,3 +107,386 @@ class AssetManager(models.Manager):
 
         # Return created assets
         return created
+
+    def sync_catalogue(self, fetched_assets, batch_size=None):
+        """
+        Create or update assets from the given registry asset dicts,
+        each with 'id', 'code', 'issuer' and 'domain' keys, in batches.
+
+        Only domain and toml url of existing assets are updated, and only
+        those that changed are written. Like bulk_create, no pre_save signal
+        or search index update is fired, so asset_id and https toml urls are
+        set here.
+
+        Returns tuple of (created assets, updated assets).
+        """
+        Account = apps.get_model('nc', 'Account')
+
+        # NOTE: Ignore those without an issuer (XLM)
+        fetched_assets = { a['id']: a for a in fetched_assets if a.get('issuer') }
+        toml_url = lambda domain: 'https://{0}{1}'.format(domain, settings.STELLAR_TOML_PATH)
+
+        # NOTE: Invalidate the asset registry once for updates and creates
+        with registry.assets.batch():
+            # Update assets already in our db if fetched details changed
+            existing_asset_ids = set()
+            updated = []
+            for model_asset in self.exclude(asset_id=None).only('asset_id', 'domain', 'toml'):
+                existing_asset_ids.add(model_asset.asset_id)
+                a = fetched_assets.get(model_asset.asset_id)
+                if a and (model_asset.domain, model_asset.toml) != (a['domain'], toml_url(a['domain'])):
+                    model_asset.domain = a['domain']
+                    model_asset.toml = toml_url(a['domain'])
+                    updated.append(model_asset)
+            bulk_update(updated, update_fields=['domain', 'toml'], batch_size=batch_size)
+            if updated:
+                registry.assets.invalidate()
+
+            # Create those not in our db, with any corresponding issuer accounts
+            new_assets = [ a for asset_id, a in fetched_assets.iteritems()
+                if asset_id not in existing_asset_ids ]
+            relevant_accounts = {
+                account.public_key: account
+                for account in Account.objects.filter(public_key__in=set([ a['issuer'] for a in new_assets ]))
+            }
+            created = self.bulk_create([
+                self.model(
+                    issuer=relevant_accounts.get(a['issuer'], None),
+                    issuer_address=a['issuer'], domain=a['domain'], code=a['code'],
+                    toml=toml_url(a['domain']),
+                )
+                for a in new_assets
+            ], batch_size)
+
+        return created, updated
+
+    def update_trusters_count(self, asset_pks):
+        """
+        Recount trusters of the assets with the given pks, in one update.
+        """
+        through = self.model.trusters.through
+        counts = through.objects.filter(asset_id=OuterRef('pk')).order_by()\
+            .values('asset_id').annotate(count=Count('id')).values('count')
+        return self.filter(pk__in=asset_pks).update(
+            trusters_count=Coalesce(Subquery(counts, output_field=models.IntegerField()), 0))
+
+    def with_market_snapshot(self):
+        """
+        Returns queryset of assets with a market snapshot, annotated with
+        each StellarTerm ticker display attribute.
+        """
+        AssetMarketSnapshot = apps.get_model('nc', 'AssetMarketSnapshot')
+        return self.filter(market_snapshot__isnull=False).annotate(**{
+            display: F('market_snapshot__' + field)
+            for display, field in AssetMarketSnapshot.DISPLAY_FIELDS.iteritems()
+        })
+
+
+class AssetMarketSnapshotManager(models.Manager):
+    def refresh(self, ticker):
+        """
+        Replace snapshots with market data for assets in the given
+        StellarTerm ticker. Assets no longer in the ticker lose their snapshot.
+
+        Returns the number of snapshots stored.
+        """
+        Asset = apps.get_model('nc', 'Asset')
+        asset_pks = dict(Asset.objects.filter(asset_id__in=ticker.assets.keys())\
+            .values_list('asset_id', 'id'))
+
+        now = timezone.now()
+        snapshots = []
+        for asset_id, asset_pk in asset_pks.iteritems():
+            ticker_asset = ticker.get(asset_id)
+            snapshot = self.model(asset_id=asset_pk, updated=now)
+            for display, field in self.model.DISPLAY_FIELDS.iteritems():
+                setattr(snapshot, field, ticker_asset.get(display))
+            if asset_id == 'XLM-native':
+                # Handling the XLM-native USD % change edge case
+                snapshot.change24h_usd = ticker.xlm_change24h_USD
+            snapshots.append(snapshot)
+
+        with transaction.atomic():
+            existing = set(self.values_list('asset_id', flat=True))
+            self.exclude(asset_id__in=asset_pks.values()).delete()
+            bulk_update([ s for s in snapshots if s.asset_id in existing ],
+                update_fields=self.model.DISPLAY_FIELDS.values() + [ 'updated' ], pk_field='asset_id')
+            self.bulk_create([ s for s in snapshots if s.asset_id not in existing ])
+
+        return len(snapshots)
+
+
+class ExchangeCandleManager(models.Manager):
+    def store(self, pair, interval, records):
+        """
+        Store the given Kraken OHLC records for pair and interval, replacing
+        any stored candles from the first record on (e.g. the previously
+        uncommitted last candle).
+        """
+        if not records:
+            return
+        with transaction.atomic():
+            self.filter(pair=pair, interval=interval, time__gte=min(r[0] for r in records)).delete()
+            self.bulk_create([
+                self.model(pair=pair, interval=interval, time=int(r[0]), open=r[1],
+                    high=r[2], low=r[3], close=r[4], vwap=r[5], volume=r[6], count=r[7])
+                for r in records
+            ])
+
+
+class TradeAggregationManager(models.Manager):
+    def store(self, asset, resolution, start, end, records):
+        """
+        Store the given Horizon trade aggregation records for asset and
+        resolution, replacing any stored buckets in [start, end).
+        """
+        with transaction.atomic():
+            self.filter(asset=asset, resolution=resolution,
+                timestamp__gte=start, timestamp__lt=end).delete()
+            self.bulk_create([
+                self.model(asset=asset, resolution=resolution, timestamp=int(r['timestamp']),
+                    trade_count=int(r['trade_count']), base_volume=r['base_volume'],
+                    counter_volume=r['counter_volume'], avg=r['avg'], high=r['high'],
+                    low=r['low'], open=r['open'], close=r['close'])
+                for r in records
+            ])
+
+
+class PerformanceRunManager(models.Manager):
+    def claim_pricing(self, slot, lease_duration):
+        """
+        Get the performance run for the given cron interval slot, creating
+        it if no other worker has yet.
+
+        Returns tuple of (run, claimed), with claimed True if this worker
+        should price the run: it created the run, or the lease of the worker
+        pricing it expired before prices were stored.
+        """
+        now = timezone.now()
+        run, created = self.get_or_create(slot=slot,
+            defaults={ 'leased_until': now + lease_duration })
+        if created:
+            return run, True
+        claimed = run.asset_prices is None and self.filter(id=run.id, asset_prices=None,
+            leased_until__lt=now).update(leased_until=now + lease_duration) == 1
+        return run, claimed
+
+    def price(self, run, asset_prices, shard_size):
+        """
+        Store asset_prices for the given run and split all portfolios into
+        shards of shard_size portfolios each.
+
+        Returns whether this worker priced the run, which is False if another
+        worker stored prices first (e.g. after this worker's lease expired).
+        """
+        Portfolio = apps.get_model('nc', 'Portfolio')
+        with transaction.atomic():
+            if not self.filter(id=run.id, asset_prices=None)\
+                .update(asset_prices=json.dumps(asset_prices)):
+                return False
+            pks = list(Portfolio.objects.order_by('pk').values_list('pk', flat=True))
+            shards = [
+                run.shards.model(run=run, first_portfolio_id=pks[i],
+                    last_portfolio_id=pks[i + shard_size - 1] if i + shard_size < len(pks) else None)
+                for i in range(0, len(pks), shard_size)
+            ]
+            run.shards.model.objects.bulk_create(shards)
+        run.asset_prices = json.dumps(asset_prices)
+        return True
+
+    def claim_ranking(self, run):
+        """
+        Claim recalculation of performance stats and ranks for the given run.
+
+        Returns True for exactly one caller, and only once the run has been
+        priced and all shards for it have completed.
+        """
+        if run.asset_prices is None or run.shards.filter(completed=None).exists():
+            return False
+        return self.filter(id=run.id, ranked=None, asset_prices__isnull=False)\
+            .update(ranked=timezone.now()) == 1
+
+
+class PerformanceShardManager(models.Manager):
+    def _available(self, now):
+        return Q(completed=None) & (Q(leased_until=None) | Q(leased_until__lt=now))
+
+    def claim(self, worker, lease_duration, since):
+        """
+        Claim the next shard not yet completed and not leased by another
+        worker, for runs with slot after since.
+
+        Returns the claimed shard or None if there are no shards left.
+        """
+        now = timezone.now()
+        available = self._available(now)
+        shard_ids = list(self.filter(available, run__ranked=None, run__slot__gte=since)\
+            .order_by('run__slot', 'first_portfolio_id').values_list('id', flat=True))
+
+        # Conditional update so only one worker can win the lease on a shard
+        for shard_id in shard_ids:
+            claimed = self.filter(available, id=shard_id)\
+                .update(worker=worker, leased_until=now + lease_duration)
+            if claimed:
+                return self.select_related('run').get(id=shard_id)
+        return None
+
+    def renew(self, shard, worker, lease_duration):
+        """
+        Extend the lease on shard if worker still holds it.
+
+        Returns whether the lease was renewed.
+        """
+        return self.filter(id=shard.id, worker=worker, completed=None)\
+            .update(leased_until=timezone.now() + lease_duration) == 1
+
+    def complete(self, shard, worker):
+        """
+        Mark shard as completed if worker still holds the lease on it.
+        """
+        return self.filter(id=shard.id, worker=worker, completed=None)\
+            .update(completed=timezone.now()) == 1
+
+
+class RollupManagerMixin(object):
+    """
+    Manager mixin for raw time series data rolled up into sum and count
+    aggregates per owner at each resolution of the rollup model.
+
+    Raw models need created and rolled_up fields. Rollup models need
+    resolution, time and count fields, the owner field and a <value>_sum
+    field per value field.
+    """
+    rollup_model_name = None
+    rollup_owner_field = None
+    rollup_value_fields = ()
+
+    def roll_up(self, chunk_size=10000):
+        """
+        Add values of raw data not yet rolled up to the rollup aggregates.
+
+        Pending rows are locked and processed in chunks, so concurrent
+        callers never add the same row twice. Returns the number of raw
+        rows rolled up.
+        """
+        Rollup = apps.get_model('nc', self.rollup_model_name)
+        resolutions = [ choice[0] for choice in Rollup.RESOLUTION_CHOICES ]
+        owner_field = self.rollup_owner_field
+        sum_fields = [ field + '_sum' for field in self.rollup_value_fields ]
+
+        total = 0
+        while True:
+            with transaction.atomic():
+                chunk = list(self.select_for_update().filter(rolled_up=False)\
+                    .order_by('id').values_list('id', flat=True)[:chunk_size])
+                if not chunk:
+                    break
+
+                for resolution in resolutions:
+                    # Aggregate the chunk by owner and interval start
+                    aggregates = self.filter(id__in=chunk)\
+                        .annotate(time=Trunc('created', resolution))\
+                        .values(owner_field, 'time')\
+                        .annotate(count=Count('id'), **{
+                            field + '_sum': Sum(field) for field in self.rollup_value_fields
+                        })\
+                        .order_by()
+
+                    # Then increment existing rollups and create any missing
+                    existing = {
+                        (getattr(r, owner_field), r.time): r
+                        for r in Rollup.objects.filter(resolution=resolution, **{
+                            owner_field + '__in': set(a[owner_field] for a in aggregates),
+                            'time__in': set(a['time'] for a in aggregates),
+                        })
+                    }
+                    to_update = []
+                    to_create = []
+                    for a in aggregates:
+                        rollup = existing.get((a[owner_field], a['time']))
+                        if rollup:
+                            for field in sum_fields + [ 'count' ]:
+                                setattr(rollup, field, getattr(rollup, field) + a[field])
+                            to_update.append(rollup)
+                        else:
+                            to_create.append(Rollup(resolution=resolution, **a))
+
+                    bulk_update(to_update, update_fields=sum_fields + [ 'count' ])
+                    Rollup.objects.bulk_create(to_create)
+
+                self.filter(id__in=chunk).update(rolled_up=True)
+                total += len(chunk)
+
+        return total
+
+    def compact(self, before):
+        """
+        Delete raw data created before the given datetime once rolled up,
+        since older values are served from the rollup aggregates.
+
+        NOTE: Only deletes rows already rolled up, so call roll_up() first.
+
+        Returns the number of raw rows deleted.
+        """
+        deleted, deleted_per_model = self.filter(created__lt=before, rolled_up=True).delete()
+        return deleted
+
+
+class RawPortfolioDataManager(RollupManagerMixin, models.Manager):
+    rollup_model_name = 'PortfolioDataRollup'
+    rollup_owner_field = 'portfolio_id'
+    rollup_value_fields = ('xlm_value', 'usd_value')
+
+    def record(self, portfolios, collector, batch_size, before_write=None):
+        """
+        Create raw data from the dicts the collector yields for the portfolios
+        in the given queryset that are outdated, like update_timeseries but
+        writing batch_size instances at a time versus all at once.
+
+        If before_write returns False before a batch is written, stops
+        recording. Returns the number of raw data instances created.
+        """
+        count = 0
+        batch = []
+        for data in collector(portfolios.filter_outdated('rawdata')):
+            batch.append(self.model(**data))
+            if len(batch) >= batch_size:
+                if before_write and not before_write():
+                    return count
+                self.bulk_create(batch)
+                count += len(batch)
+                batch = []
+
+        if batch and (not before_write or before_write()):
+            self.bulk_create(batch)
+            count += len(batch)
+        return count
+
+
+class AssetPriceManager(RollupManagerMixin, models.Manager):
+    rollup_model_name = 'AssetPriceRollup'
+    rollup_owner_field = 'asset_id'
+    rollup_value_fields = ('xlm_price', 'usd_price')
+
+    def record(self, asset_prices, batch_size=None):
+        """
+        Create a price for each asset in the given asset_prices dict
+        { asset_id: price }, with prices in XLM apart from XLM itself in USD.
+        Assets without a market price (0.0) are skipped.
+
+        Returns the number of prices created, which is none if XLM has no
+        USD price.
+        """
+        usd_xlm_price = asset_prices.get('XLM-native')
+        if not usd_xlm_price:
+            return 0
+
+        asset_pks = registry.assets.pk_map(asset_prices.keys())
+        created = self.bulk_create([
+            self.model(asset_id=asset_pks[asset_id],
+                xlm_price=1.0 if asset_id == 'XLM-native' else price,
+                usd_price=usd_xlm_price if asset_id == 'XLM-native' else price * usd_xlm_price)
+            for asset_id, price in asset_prices.iteritems()
+            if asset_id in asset_pks and price
+        ], batch_size)
+        return len(created)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0055_auto_20181008_1727'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.DateTimeField(unique=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('asset_prices', models.TextField()),
+                ('ranked', models.DateTimeField(blank=True, default=None, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PerformanceShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_portfolio_id', models.PositiveIntegerField()),
+                ('last_portfolio_id', models.PositiveIntegerField(blank=True, default=None, null=True)),
+                ('worker', models.CharField(blank=True, default=None, max_length=255, null=True)),
+                ('leased_until', models.DateTimeField(blank=True, db_index=True, default=None, null=True)),
+                ('completed', models.DateTimeField(blank=True, db_index=True, default=None, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='nc.PerformanceRun')),
+            ],
+        ),
+    ]
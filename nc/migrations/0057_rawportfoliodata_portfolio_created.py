@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:03
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0056_performancerun_performanceshard'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='rawportfoliodata',
+            index_together=set([('portfolio', 'created')]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:13
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0057_rawportfoliodata_portfolio_created'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioDataRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('time', models.DateTimeField()),
+                ('xlm_value_sum', models.FloatField(default=0.0)),
+                ('usd_value_sum', models.FloatField(default=0.0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='nc.Portfolio')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='rawportfoliodata',
+            name='rolled_up',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterUniqueTogether(
+            name='portfoliodatarollup',
+            unique_together=set([('portfolio', 'resolution', 'time')]),
+        ),
+    ]
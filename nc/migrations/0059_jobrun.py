@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0058_portfoliodatarollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('worker', models.CharField(blank=True, default=None, max_length=255, null=True)),
+                ('started', models.DateTimeField(db_index=True)),
+                ('finished', models.DateTimeField(blank=True, default=None, null=True)),
+                ('phases', models.TextField(default='{}')),
+                ('metrics', models.TextField(default='{}')),
+                ('error', models.TextField(blank=True, default=None, null=True)),
+            ],
+            options={
+                'ordering': ['-started'],
+            },
+        ),
+    ]
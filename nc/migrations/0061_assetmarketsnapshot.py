@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0060_account_balances_ledgercursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetMarketSnapshot',
+            fields=[
+                ('asset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='market_snapshot', serialize=False, to='nc.Asset')),
+                ('activity_score', models.FloatField(blank=True, db_index=True, default=None, null=True)),
+                ('price_usd', models.FloatField(blank=True, db_index=True, default=None, null=True)),
+                ('change24h_usd', models.FloatField(blank=True, db_index=True, default=None, null=True)),
+                ('price_xlm', models.FloatField(blank=True, db_index=True, default=None, null=True)),
+                ('change24h_xlm', models.FloatField(blank=True, db_index=True, default=None, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
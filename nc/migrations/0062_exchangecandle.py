@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0061_assetmarketsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeCandle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pair', models.CharField(max_length=20)),
+                ('interval', models.PositiveIntegerField()),
+                ('time', models.BigIntegerField()),
+                ('open', models.CharField(max_length=32)),
+                ('high', models.CharField(max_length=32)),
+                ('low', models.CharField(max_length=32)),
+                ('close', models.CharField(max_length=32)),
+                ('vwap', models.CharField(max_length=32)),
+                ('volume', models.CharField(max_length=32)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExchangeCandleCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pair', models.CharField(max_length=20)),
+                ('interval', models.PositiveIntegerField()),
+                ('last', models.BigIntegerField()),
+                ('fetched', models.DateTimeField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='exchangecandlecursor',
+            unique_together=set([('pair', 'interval')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='exchangecandle',
+            unique_together=set([('pair', 'interval', 'time')]),
+        ),
+    ]
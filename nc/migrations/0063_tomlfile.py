@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0062_exchangecandle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TomlFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True)),
+                ('etag', models.CharField(blank=True, default=None, max_length=255, null=True)),
+                ('last_modified', models.CharField(blank=True, default=None, max_length=255, null=True)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('currencies', models.TextField(default='[]')),
+                ('fetched', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:29
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0063_tomlfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='amount',
+            field=models.DecimalField(blank=True, decimal_places=7, default=None, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='num_accounts',
+            field=models.PositiveIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='refreshed',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0064_asset_refreshed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='asset',
+            name='asset_id',
+            field=models.CharField(blank=True, default=None, max_length=70, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_trusters(apps, schema_editor):
+    Asset = apps.get_model('nc', 'Asset')
+    for asset_id, count in Asset.trusters.through.objects.order_by()\
+        .values_list('asset_id').annotate(count=Count('id')):
+        Asset.objects.filter(id=asset_id).update(trusters_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0065_asset_id_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='trusters_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_trusters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0066_asset_trusters_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetPrice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('xlm_price', models.FloatField()),
+                ('usd_price', models.FloatField()),
+                ('rolled_up', models.BooleanField(db_index=True, default=False)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='nc.Asset')),
+            ],
+            options={
+                'ordering': ('-created',),
+                'abstract': False,
+                'get_latest_by': 'created',
+            },
+        ),
+        migrations.CreateModel(
+            name='AssetPriceRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=5)),
+                ('time', models.DateTimeField()),
+                ('xlm_price_sum', models.FloatField(default=0.0)),
+                ('usd_price_sum', models.FloatField(default=0.0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_rollups', to='nc.Asset')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='assetpricerollup',
+            unique_together=set([('asset', 'resolution', 'time')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='assetprice',
+            index_together=set([('asset', 'created')]),
+        ),
+    ]
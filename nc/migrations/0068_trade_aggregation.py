@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 20:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0067_asset_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TradeAggregation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.BigIntegerField()),
+                ('timestamp', models.BigIntegerField()),
+                ('trade_count', models.PositiveIntegerField(default=0)),
+                ('base_volume', models.CharField(max_length=32)),
+                ('counter_volume', models.CharField(max_length=32)),
+                ('avg', models.CharField(max_length=32)),
+                ('high', models.CharField(max_length=32)),
+                ('low', models.CharField(max_length=32)),
+                ('open', models.CharField(max_length=32)),
+                ('close', models.CharField(max_length=32)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trade_aggregations', to='nc.Asset')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TradeAggregationCoverage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.BigIntegerField()),
+                ('start', models.BigIntegerField()),
+                ('end', models.BigIntegerField()),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trade_aggregation_coverages', to='nc.Asset')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='tradeaggregationcoverage',
+            unique_together=set([('asset', 'resolution')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tradeaggregation',
+            unique_together=set([('asset', 'resolution', 'timestamp')]),
+        ),
+    ]
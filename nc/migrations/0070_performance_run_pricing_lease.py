@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2026-10-18 21:13
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nc', '0069_follower_index_delta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performancerun',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name='performancerun',
+            name='asset_prices',
+            field=models.TextField(blank=True, default=None, null=True),
+        ),
+    ]
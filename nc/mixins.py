@@ -6,7 +6,7 @@ from collections import OrderedDict
 
 from django.conf import settings
 from django.core import signing
-from django.db.models import prefetch_related_objects
+from django.db.models import BooleanField, Exists, OuterRef, prefetch_related_objects, Value
 from django.http import JsonResponse
 from django.views.generic.detail import SingleObjectMixin
 
@@ -17,8 +17,8 @@ from stellar_base.utils import AccountNotExistError
 
 from stream_django.feed_manager import feed_manager
 
-from . import forms
-from .models import Account, Asset, RawPortfolioData
+from . import forms, registry, trustlines
+from .models import Account, Asset, FollowRequest, Profile, RawPortfolioData
 
 
 class PrefetchedSingleObjectMixin(SingleObjectMixin):
@@ -344,18 +344,16 @@ class UserAssetsContextMixin(object):
             }
 
             # Build the model assets for pic of token in template
-            # NOTE: Getting all of the assets each issuer offers here versus just those
-            # the current user owns to make the Asset query easier
             model_asset_ids = [
                 k[1] + '-' + k[0]
                 if k[0] else 'XLM-native'
                 for k, v in assets.iteritems()
             ]
-            model_assets = {
-                (a.issuer_address, a.code): a
-                for a in Asset.objects.filter(asset_id__in=model_asset_ids)\
-                    .select_related('issuer')
-            }
+            model_assets = {}
+            for issuer_address, code in assets:
+                record = registry.assets.get_by_pair(code, issuer_address)
+                if record:
+                    model_assets[(issuer_address, code)] = record
 
             # Build any model assets that aren't in our db
             # General try, except here because always want to return user obj no matter what
@@ -371,8 +369,9 @@ class UserAssetsContextMixin(object):
             # Update the list of assets the user associated with the profile trusts in db
             # TODO: When implement tx activity listener for Stellar accounts, listen to Change Trust
             # ops to implement the below in real time for ledger changes
-            user.assets_trusting.clear()
-            user.assets_trusting.add(*Asset.objects.filter(asset_id__in=model_asset_ids))
+            trustline_sync = trustlines.TrustlineSynchronizer()
+            trustline_sync.set_user_assets(user.id, model_asset_ids)
+            trustline_sync.sync()
 
             # Update the kwargs
             kwargs.update({
@@ -386,6 +385,30 @@ class UserAssetsContextMixin(object):
         return kwargs
 
 
+class FollowStatusQuerysetMixin(object):
+    """
+    A mixin that annotates a user queryset with whether the current user
+    is following (is_following) and has requested to follow
+    (requested_to_follow) each user.
+
+    Both are correlated EXISTS subqueries, so the query stays the same size
+    however many users the current user follows.
+    """
+    def annotate_follow_status(self, qset, requested_to_follow=True):
+        annotations = {}
+        if self.request.user.is_authenticated:
+            annotations['is_following'] = Exists(Profile.followers.through.objects\
+                .filter(profile__user_id=OuterRef('pk'), user_id=self.request.user.id))
+            if requested_to_follow:
+                annotations['requested_to_follow'] = Exists(FollowRequest.objects\
+                    .filter(user_id=OuterRef('pk'), requester_id=self.request.user.id))
+        else:
+            annotations['is_following'] = Value(False, output_field=BooleanField())
+            if requested_to_follow:
+                annotations['requested_to_follow'] = Value(False, output_field=BooleanField())
+        return qset.annotate(**annotations)
+
+
 class UserFollowerRequestsContextMixin(object):
     """
     A mixin that adds current user's follower requests prefetched.
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-import os, requests, toml, urlparse
+import json, os, requests, toml, urlparse
 
 from allauth.utils import build_absolute_uri
 
+from collections import OrderedDict
 from datetime import timedelta
 
 from django.conf import settings
@@ -14,18 +15,17 @@ from django.db import models
 from django.forms.models import model_to_dict
 from django.urls import reverse
 from django.utils.crypto import get_random_string
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 
 from functools import partial
 
 from stellar_base.asset import Asset as StellarAsset
-from stellar_base.address import Address
-from stellar_base.utils import AccountNotExistError
 
 from timeseries.utils import TimeSeriesModel, TimeSeriesManager
 
-from . import managers, validators
+from . import fetchers, instrumentation, managers, trustlines, validators
 
 
 def profile_file_directory_path(instance, filename, field):
@@ -91,6 +91,8 @@ class Profile(models.Model):
     full_name = models.CharField(max_length=200, null=True, blank=True, default=None)
     followers_count = models.IntegerField(default=0)
 
+    objects = managers.ProfileManager()
+
     def username(self):
         """
         Have this method as a proxy for the search index.
@@ -138,6 +140,26 @@ class FollowRequest(models.Model):
         return 'Follow request: ' + self.requester.username + ' -> ' + self.user.username
 
 
+@python_2_unicode_compatible
+class FollowerIndexDelta(models.Model):
+    """
+    Follower added to or removed from a profile, pending a push of the
+    change to the search index.
+    """
+    profile = models.ForeignKey(Profile, related_name='follower_index_deltas',
+        on_delete=models.CASCADE)
+    follower = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+',
+        on_delete=models.CASCADE)
+    followed = models.BooleanField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = managers.FollowerIndexDeltaManager()
+
+    def __str__(self):
+        return 'Follower index delta: {0} {1} {2}'.format(self.follower_id,
+            '->' if self.followed else '-/>', self.profile_id)
+
+
 @python_2_unicode_compatible
 class Account(models.Model):
     """
@@ -166,6 +188,25 @@ class Account(models.Model):
     user_full_name = models.CharField(max_length=200, null=True, blank=True, default=None)
     user_pic_url = models.URLField(null=True, blank=True, default=None)
 
+    # NOTE: Ledger stream consumer bumps balances_version when account has activity on
+    # the Stellar network. Stored AccountBalance records are current as long as
+    # balances_synced_version matches (None if never stored)
+    balances_version = models.PositiveIntegerField(default=0)
+    balances_synced_version = models.PositiveIntegerField(null=True, blank=True, default=None)
+    balances_updated = models.DateTimeField(null=True, blank=True, default=None)
+
+    # Account manager
+    objects = managers.AccountManager()
+
+    def has_current_balances(self, updated_since):
+        """
+        Whether stored balances are up to date with ledger activity and were
+        last fetched from Horizon after updated_since.
+        """
+        return self.balances_synced_version == self.balances_version\
+            and self.balances_updated is not None\
+            and self.balances_updated >= updated_since
+
     def create_notifier_subscription(self, request):
         """
         Create StellarNotifier subscription for this account
@@ -267,6 +308,41 @@ class Account(models.Model):
         return name + self.public_key
 
 
+@python_2_unicode_compatible
+class AccountBalance(models.Model):
+    """
+    Stored balance of an asset held in an account, as of the last time
+    account balances were fetched from Horizon.
+    """
+    account = models.ForeignKey(Account, related_name='balances',
+        on_delete=models.CASCADE)
+    asset_id = models.CharField(max_length=70)
+    balance = models.FloatField(default=0.0)
+
+    # Account balance manager
+    objects = managers.AccountBalanceManager()
+
+    class Meta:
+        unique_together = ('account', 'asset_id')
+
+    def __str__(self):
+        return '{0}: {1} {2}'.format(self.account.public_key, self.balance, self.asset_id)
+
+
+@python_2_unicode_compatible
+class LedgerCursor(models.Model):
+    """
+    Paging token of the last Horizon stream event processed by the ledger
+    stream consumer, so it resumes where it left off after a restart.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    paging_token = models.CharField(max_length=50)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.name, self.paging_token)
+
+
 @python_2_unicode_compatible
 class AccountFundRequest(models.Model):
     """
@@ -303,7 +379,7 @@ class Asset(models.Model):
     issuer_address = models.CharField(max_length=56, null=True, blank=True, default=None)
     domain = models.CharField(max_length=255, null=True, blank=True, default=None)
     code = models.CharField(max_length=12)
-    asset_id = models.CharField(max_length=70, null=True, blank=True, default=None)
+    asset_id = models.CharField(max_length=70, unique=True, null=True, blank=True, default=None)
 
     trusters = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
@@ -346,6 +422,14 @@ class Asset(models.Model):
     toml_pic = models.URLField(null=True, blank=True, default=None)
     verified = models.BooleanField(default=False)
 
+    # NOTE: Kept in sync with trusters through m2m signals and trustline syncs
+    trusters_count = models.IntegerField(default=0)
+
+    # Stats from the asset record on Horizon, as of the last refresh
+    amount = models.DecimalField(max_digits=20, decimal_places=7, null=True, blank=True, default=None)
+    num_accounts = models.PositiveIntegerField(null=True, blank=True, default=None)
+    refreshed = models.DateTimeField(null=True, blank=True, default=None)
+
     # Asset manager
     objects = managers.AssetManager()
 
@@ -386,10 +470,62 @@ class Asset(models.Model):
         stellar_asset = StellarAsset(self.code, self.issuer_address)
         return stellar_asset.type
 
+    def is_refresh_due(self):
+        """
+        Whether Horizon stats and toml details are older than the refresh interval.
+        """
+        return self.refreshed is None or (timezone.now() - self.refreshed).total_seconds()\
+            >= settings.ASSET_REFRESH_INTERVAL
+
+    def refresh_from_horizon(self):
+        """
+        Fetch the asset record from Horizon, storing its stats and updating
+        attributes of this instance from the toml file it links to.
+        """
+        params = {
+            'asset_issuer': self.issuer_address,
+            'asset_code': self.code,
+        }
+        json = fetchers.get_json('{0}/assets'.format(settings.STELLAR_HORIZON), params=params)
+
+        # NOTE: On testnet, won't get a record if mainnet issuer id isn't the same as testnet's
+        records = json.get('_embedded', {}).get('records', [])
+        record = records[0] if records else {}
+
+        # NOTE: Update versus save so stats alone don't trigger search index updates
+        self.amount = record.get('amount')
+        self.num_accounts = record.get('num_accounts')
+        self.refreshed = timezone.now()
+        Asset.objects.filter(pk=self.pk).update(amount=self.amount,
+            num_accounts=self.num_accounts, refreshed=self.refreshed)
+
+        toml_url = record.get('_links', {}).get('toml', {}).get('href') or None
+        return self.update_from_toml(toml_url)
+
     def update_from_toml(self, toml_url=None):
         """
         Fetch toml file and update attributes of this instance with its details.
         """
+        # Use try except in case no toml file exists at given toml_url
+        parsed_toml = None
+        if toml_url:
+            try:
+                r = fetchers.get(toml_url, timeout=settings.TOML_FETCH_TIMEOUT, retries=0)
+                parsed_toml = toml.loads(r.text)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                fetchers.TransientFetchError):
+                pass
+
+        return self.apply_toml(toml_url, parsed_toml)
+
+    def apply_toml(self, toml_url, parsed_toml):
+        """
+        Update attributes of this instance with its details in an already
+        parsed toml file, saving if any changed.
+
+        parsed_toml is None if no toml file could be fetched from toml_url.
+        Returns whether the instance was updated.
+        """
         updated = False
 
         # Create dict of instance data to check for changes later
@@ -400,41 +536,35 @@ class Asset(models.Model):
         # Set the new toml value
         self.toml = toml_url
         self.domain = urlparse.urlparse(toml_url).netloc if toml_url else None
-        if not toml_url:
+        if not toml_url or parsed_toml is None:
             self.verified = False
 
-        # Fetch the toml file and check for this asset in [[CURRENCIES]]
-        # Use try except in case no toml file exists at given toml_url
-        if self.toml:
-            try:
-                r = requests.get(self.toml)
-                parsed_toml = toml.loads(r.text)
-                matched_currencies = [ c for c in parsed_toml.get('CURRENCIES', [])
-                    if c.get('code', None) == self.code and c.get('issuer') == self.issuer_address ]
+        # Check for this asset in [[CURRENCIES]] of the toml file
+        if self.toml and parsed_toml is not None:
+            matched_currencies = [ c for c in parsed_toml.get('CURRENCIES', [])
+                if c.get('code', None) == self.code and c.get('issuer') == self.issuer_address ]
 
-                self.verified = (len(matched_currencies) == 1)
-                if self.verified:
-                    # If matched, then asset has been verified and start updating instance fields
-                    currency = matched_currencies[0]
-                    if 'image' in currency:
-                        self.toml_pic = currency['image']
+            self.verified = (len(matched_currencies) == 1)
+            if self.verified:
+                # If matched, then asset has been verified and start updating instance fields
+                currency = matched_currencies[0]
+                if 'image' in currency:
+                    self.toml_pic = currency['image']
 
-                    if 'name' in currency:
-                        # NOTE: problems here if desc is longer than 255 so concat for db
-                        self.name = currency['name'][:255]
+                if 'name' in currency:
+                    # NOTE: problems here if desc is longer than 255 so concat for db
+                    self.name = currency['name'][:255]
 
-                    if 'desc' in currency:
-                        # NOTE: problems here if desc is longer than 255 so concat for db
-                        self.description = currency['desc'][:255]
+                if 'desc' in currency:
+                    # NOTE: problems here if desc is longer than 255 so concat for db
+                    self.description = currency['desc'][:255]
 
-                    if 'conditions' in currency:
-                        # NOTE: problems here if conditions is longer than 255 so concat for db
-                        self.conditions = currency['conditions'][:255]
+                if 'conditions' in currency:
+                    # NOTE: problems here if conditions is longer than 255 so concat for db
+                    self.conditions = currency['conditions'][:255]
 
-                    if 'display_decimals' in currency:
-                        self.display_decimals = currency['display_decimals']
-            except requests.exceptions.ConnectionError:
-                self.verified = False
+                if 'display_decimals' in currency:
+                    self.display_decimals = currency['display_decimals']
 
         # Check whether any fields have been updated
         for field in fields_to_update:
@@ -443,8 +573,11 @@ class Asset(models.Model):
                 break
 
         # Save the instance
+        # NOTE: Only toml fields so counts kept in sync elsewhere aren't overwritten
         if updated:
-            self.save()
+            self.save(update_fields=fields_to_update)
+
+        return updated
 
     class Meta:
         unique_together = ('issuer_address', 'code')
@@ -459,6 +592,185 @@ class Asset(models.Model):
         return asset_id
 
 
+@python_2_unicode_compatible
+class TomlFile(models.Model):
+    """
+    Last fetched version of a stellar.toml file, with the validators to
+    conditionally refetch it and its [[CURRENCIES]] already parsed.
+    """
+    url = models.URLField(unique=True)
+    etag = models.CharField(max_length=255, null=True, blank=True, default=None)
+    last_modified = models.CharField(max_length=255, null=True, blank=True, default=None)
+
+    # SHA-256 hex digest of the file content, so unchanged files aren't
+    # parsed again if served without validators
+    content_hash = models.CharField(max_length=64)
+
+    # JSON list of [[CURRENCIES]] in the file
+    currencies = models.TextField(default='[]')
+    fetched = models.DateTimeField()
+
+    def parsed_toml(self):
+        """
+        Returns dict with the stored currencies, as they'd be in the parsed file.
+        """
+        return { 'CURRENCIES': json.loads(self.currencies) }
+
+    def __str__(self):
+        return self.url
+
+
+@python_2_unicode_compatible
+class AssetMarketSnapshot(models.Model):
+    """
+    Market data for an asset as of the last refresh from the StellarTerm
+    ticker, so asset lists can be ordered and paginated in the db.
+    """
+    # Map from StellarTerm ticker display attribute to snapshot field
+    DISPLAY_FIELDS = OrderedDict([
+        ('activityScore', 'activity_score'),
+        ('price_USD', 'price_usd'),
+        ('change24h_USD', 'change24h_usd'),
+        ('price_XLM', 'price_xlm'),
+        ('change24h_XLM', 'change24h_xlm'),
+    ])
+
+    asset = models.OneToOneField(Asset, related_name='market_snapshot',
+        on_delete=models.CASCADE, primary_key=True)
+
+    activity_score = models.FloatField(null=True, blank=True, default=None, db_index=True)
+    price_usd = models.FloatField(null=True, blank=True, default=None, db_index=True)
+    change24h_usd = models.FloatField(null=True, blank=True, default=None, db_index=True)
+    price_xlm = models.FloatField(null=True, blank=True, default=None, db_index=True)
+    change24h_xlm = models.FloatField(null=True, blank=True, default=None, db_index=True)
+
+    updated = models.DateTimeField(auto_now=True)
+
+    # Snapshot manager
+    objects = managers.AssetMarketSnapshotManager()
+
+    def __str__(self):
+        return 'Market snapshot: ' + str(self.asset)
+
+
+@python_2_unicode_compatible
+class ExchangeCandle(models.Model):
+    """
+    Stored OHLC candle from Kraken for an exchange pair and interval (in
+    minutes), with time as the candle start in seconds.
+
+    Prices and volume are kept as returned by Kraken.
+    """
+    pair = models.CharField(max_length=20)
+    interval = models.PositiveIntegerField()
+    time = models.BigIntegerField()
+
+    open = models.CharField(max_length=32)
+    high = models.CharField(max_length=32)
+    low = models.CharField(max_length=32)
+    close = models.CharField(max_length=32)
+    vwap = models.CharField(max_length=32)
+    volume = models.CharField(max_length=32)
+    count = models.PositiveIntegerField(default=0)
+
+    # Candle manager
+    objects = managers.ExchangeCandleManager()
+
+    class Meta:
+        unique_together = ('pair', 'interval', 'time')
+
+    def to_record(self):
+        """
+        Returns candle in Kraken record format of [ <time>, <open>, <high>,
+        <low>, <close>, <vwap>, <volume>, <count> ].
+        """
+        return [ self.time, self.open, self.high, self.low, self.close,
+            self.vwap, self.volume, self.count ]
+
+    def __str__(self):
+        return '{0} {1}m: {2}'.format(self.pair, self.interval, self.time)
+
+
+@python_2_unicode_compatible
+class TradeAggregation(models.Model):
+    """
+    Stored closed Horizon trade aggregation bucket for an asset against XLM
+    at a resolution, with resolution and timestamp (bucket start) in
+    milliseconds.
+
+    Prices and volumes are kept as returned by Horizon.
+    """
+    asset = models.ForeignKey(Asset, related_name='trade_aggregations',
+        on_delete=models.CASCADE)
+    resolution = models.BigIntegerField()
+    timestamp = models.BigIntegerField()
+
+    trade_count = models.PositiveIntegerField(default=0)
+    base_volume = models.CharField(max_length=32)
+    counter_volume = models.CharField(max_length=32)
+    avg = models.CharField(max_length=32)
+    high = models.CharField(max_length=32)
+    low = models.CharField(max_length=32)
+    open = models.CharField(max_length=32)
+    close = models.CharField(max_length=32)
+
+    # Trade aggregation manager
+    objects = managers.TradeAggregationManager()
+
+    RECORD_FIELDS = ('timestamp', 'trade_count', 'base_volume', 'counter_volume',
+        'avg', 'high', 'low', 'open', 'close')
+
+    class Meta:
+        unique_together = ('asset', 'resolution', 'timestamp')
+
+    def to_record(self):
+        """
+        Returns bucket in Horizon trade aggregation record format.
+        """
+        return { field: getattr(self, field) for field in self.RECORD_FIELDS }
+
+    def __str__(self):
+        return '{0} {1}ms: {2}'.format(self.asset, self.resolution, self.timestamp)
+
+
+@python_2_unicode_compatible
+class TradeAggregationCoverage(models.Model):
+    """
+    Contiguous range [start, end) of timestamps (in milliseconds) over which
+    all closed trade aggregation buckets for an asset at a resolution have
+    been fetched from Horizon and stored, including those without trades.
+    """
+    asset = models.ForeignKey(Asset, related_name='trade_aggregation_coverages',
+        on_delete=models.CASCADE)
+    resolution = models.BigIntegerField()
+    start = models.BigIntegerField()
+    end = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('asset', 'resolution')
+
+    def __str__(self):
+        return '{0} {1}ms: [{2}, {3})'.format(self.asset, self.resolution, self.start, self.end)
+
+
+@python_2_unicode_compatible
+class ExchangeCandleCursor(models.Model):
+    """
+    Kraken 'last' cursor for an exchange pair and interval, from which
+    to fetch newer candles than those stored.
+    """
+    pair = models.CharField(max_length=20)
+    interval = models.PositiveIntegerField()
+    last = models.BigIntegerField()
+    fetched = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('pair', 'interval')
+
+    def __str__(self):
+        return '{0} {1}m: {2}'.format(self.pair, self.interval, self.last)
+
+
 @python_2_unicode_compatible
 class Portfolio(models.Model):
     """
@@ -497,7 +809,7 @@ class Portfolio(models.Model):
 class RawPortfolioData(TimeSeriesModel):
     # Update every 5 minutes on cron job but put min interval at 2.5 minutes to be safe.
     # NOTE: Cron job taking 1 min at this point with 100 portfolios + 100 assets
-    # TODO: Parallelize cron workers for scaling by having separate instances take on smaller subsets of all portfolios?
+    # Separate worker instances take on smaller subsets of all portfolios through PerformanceShard leases
     TIMESERIES_INTERVAL = timedelta(minutes=2.5)
     NOT_AVAILABLE = -1.0
 
@@ -505,11 +817,238 @@ class RawPortfolioData(TimeSeriesModel):
     xlm_value = models.FloatField(default=NOT_AVAILABLE)
     usd_value = models.FloatField(default=NOT_AVAILABLE)
 
+    # Whether values have been added to the PortfolioDataRollup aggregates yet
+    rolled_up = models.BooleanField(default=False, db_index=True)
+
+    # Raw portfolio data manager
+    objects = managers.RawPortfolioDataManager()
+
+    class Meta(TimeSeriesModel.Meta):
+        # NOTE: For performance stat subqueries on portfolio over created ranges
+        index_together = ('portfolio', 'created')
+
     def __str__(self):
         return str(self.portfolio) + ': ' + str(self.usd_value) + ' (' + str(self.created) + ')'
 
 
-def portfolio_data_collector(queryset, asset_prices):
+@python_2_unicode_compatible
+class PortfolioDataRollup(models.Model):
+    """
+    Pre-aggregated RawPortfolioData values for a portfolio at hour, day
+    or month resolution.
+
+    Stores sums and counts versus averages so new raw data can be added
+    incrementally. Time is the start of the resolution interval.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    MONTH = 'month'
+    RESOLUTION_CHOICES = (
+        (HOUR, _('Hour')),
+        (DAY, _('Day')),
+        (MONTH, _('Month')),
+    )
+
+    portfolio = models.ForeignKey(Portfolio, related_name='rollups',
+        on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=5, choices=RESOLUTION_CHOICES)
+    time = models.DateTimeField()
+
+    xlm_value_sum = models.FloatField(default=0.0)
+    usd_value_sum = models.FloatField(default=0.0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('portfolio', 'resolution', 'time')
+
+    def average(self, value_attr):
+        """
+        Returns the average of value_attr ('xlm_value' or 'usd_value') over
+        the raw data in this interval.
+        """
+        return getattr(self, value_attr + '_sum') / self.count if self.count else None
+
+    def __str__(self):
+        return '{0}: {1} {2}'.format(self.portfolio, self.resolution, self.time)
+
+
+@python_2_unicode_compatible
+class AssetPrice(TimeSeriesModel):
+    """
+    Market price of an asset as of a performance cron run, in XLM and USD.
+    """
+    TIMESERIES_INTERVAL = timedelta(seconds=settings.PERFORMANCE_RUN_INTERVAL / 2)
+
+    asset = models.ForeignKey(Asset, related_name='prices', on_delete=models.CASCADE)
+    xlm_price = models.FloatField()
+    usd_price = models.FloatField()
+
+    # Whether prices have been added to the AssetPriceRollup aggregates yet
+    rolled_up = models.BooleanField(default=False, db_index=True)
+
+    # Asset price manager
+    objects = managers.AssetPriceManager()
+
+    class Meta(TimeSeriesModel.Meta):
+        # NOTE: For price history queries on asset over created ranges
+        index_together = ('asset', 'created')
+
+    def __str__(self):
+        return '{0}: {1} XLM ({2})'.format(self.asset, self.xlm_price, self.created)
+
+
+@python_2_unicode_compatible
+class AssetPriceRollup(models.Model):
+    """
+    Pre-aggregated AssetPrice values for an asset at hour or day resolution.
+
+    Stores sums and counts versus averages so new prices can be added
+    incrementally. Time is the start of the resolution interval.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    RESOLUTION_CHOICES = (
+        (HOUR, _('Hour')),
+        (DAY, _('Day')),
+    )
+
+    asset = models.ForeignKey(Asset, related_name='price_rollups',
+        on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=5, choices=RESOLUTION_CHOICES)
+    time = models.DateTimeField()
+
+    xlm_price_sum = models.FloatField(default=0.0)
+    usd_price_sum = models.FloatField(default=0.0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('asset', 'resolution', 'time')
+
+    def __str__(self):
+        return '{0}: {1} {2}'.format(self.asset, self.resolution, self.time)
+
+
+@python_2_unicode_compatible
+class PerformanceRun(models.Model):
+    """
+    Single run of the performance cron job for a cron interval slot.
+
+    Portfolios are split into PerformanceShard batches that separate
+    worker instances claim through leases. Performance stats and ranks
+    are recalculated once, after all shards for the run have completed.
+
+    Only the worker holding the run's pricing lease fetches asset prices,
+    with shards created once they're stored.
+    """
+    # Start of the cron interval this run records portfolio values for
+    slot = models.DateTimeField(unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    # JSON dict of { asset_id: price } so all shards value portfolios the same.
+    # None until the worker pricing the run stores them
+    asset_prices = models.TextField(null=True, blank=True, default=None)
+
+    # Expiry of the pricing worker's lease, after which another worker can
+    # price the run if it still has no prices
+    leased_until = models.DateTimeField(null=True, blank=True, default=None)
+
+    # Set once a worker has claimed recalculation of performance stats, ranks
+    ranked = models.DateTimeField(null=True, blank=True, default=None)
+
+    # Run manager
+    objects = managers.PerformanceRunManager()
+
+    def get_asset_prices(self):
+        return json.loads(self.asset_prices)
+
+    def __str__(self):
+        return 'Performance run: ' + str(self.slot)
+
+
+@python_2_unicode_compatible
+class PerformanceShard(models.Model):
+    """
+    Batch of portfolios (by primary key range) to record values for in a
+    performance run.
+
+    Workers claim a shard by setting themselves as its worker with a lease
+    expiry. If a worker crashes, its lease expires and the shard is
+    picked up again by another worker.
+    """
+    run = models.ForeignKey(PerformanceRun, related_name='shards',
+        on_delete=models.CASCADE)
+
+    # Inclusive portfolio pk range. NOTE: last_portfolio_id is None for the
+    # final shard so portfolios created after the run started are included.
+    first_portfolio_id = models.PositiveIntegerField()
+    last_portfolio_id = models.PositiveIntegerField(null=True, blank=True, default=None)
+
+    worker = models.CharField(max_length=255, null=True, blank=True, default=None)
+    leased_until = models.DateTimeField(null=True, blank=True, default=None, db_index=True)
+    completed = models.DateTimeField(null=True, blank=True, default=None, db_index=True)
+
+    # Shard manager
+    objects = managers.PerformanceShardManager()
+
+    def portfolios(self):
+        """
+        Returns queryset of portfolios in this shard.
+        """
+        queryset = Portfolio.objects.filter(pk__gte=self.first_portfolio_id)
+        if self.last_portfolio_id is not None:
+            queryset = queryset.filter(pk__lte=self.last_portfolio_id)
+        return queryset
+
+    def __str__(self):
+        return '{0} [{1}, {2}]'.format(self.run, self.first_portfolio_id,
+            self.last_portfolio_id)
+
+
+@python_2_unicode_compatible
+class JobRun(models.Model):
+    """
+    Single run of a cron job on a worker, with time spent in each of its
+    phases and metrics for the external calls made.
+    """
+    name = models.CharField(max_length=255, db_index=True)
+    worker = models.CharField(max_length=255, null=True, blank=True, default=None)
+    started = models.DateTimeField(db_index=True)
+    finished = models.DateTimeField(null=True, blank=True, default=None)
+
+    # JSON dict of { phase: { 'seconds': total, 'count': times entered } }
+    phases = models.TextField(default='{}')
+
+    # JSON dict of { host: { 'count', 'errors', 'retries', 'seconds',
+    # 'max_seconds', 'histogram': { bucket: count } } }
+    metrics = models.TextField(default='{}')
+
+    # Exception raised, if the run failed
+    error = models.TextField(null=True, blank=True, default=None)
+
+    class Meta:
+        ordering = ['-started']
+
+    def duration(self):
+        return (self.finished - self.started).total_seconds() if self.finished else None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'worker': self.worker,
+            'started': self.started,
+            'finished': self.finished,
+            'duration': self.duration(),
+            'phases': json.loads(self.phases),
+            'metrics': json.loads(self.metrics),
+            'error': self.error,
+        }
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.name, self.started)
+
+
+def portfolio_data_collector(queryset, asset_prices, batch_size=None, before_write=None):
     """
     Should return an iterable that yields dictionaries of data
     needed to successfully create a RawPortfolioData instance.
@@ -517,73 +1056,145 @@ def portfolio_data_collector(queryset, asset_prices):
     asset_prices is a dict with asset_id: current_market_price, with
     market prices as float.
     If not native, market prices in XLM. Otherwise, in USD.
+
+    Portfolios are processed in batches of batch_size, with data yielded
+    per batch, so memory use depends on the batch size versus the
+    number of portfolios in queryset.
+
+    If before_write returns False before a batch's balances and trustlines
+    are written, stops collecting.
+    """
+    batch_size = batch_size or settings.PORTFOLIO_COLLECTOR_BATCH_SIZE
+
+    # Stored balances are only used while the ledger stream consumer is keeping
+    # up with activity. Otherwise, treat all stored balances as outdated
+    now = timezone.now()
+    stream_live = LedgerCursor.objects.filter(name=settings.LEDGER_STREAM_CURSOR_NAME,
+        updated__gte=now - timedelta(seconds=settings.LEDGER_STREAM_MAX_LAG)).exists()
+    updated_since = now - timedelta(seconds=settings.LEDGER_STREAM_MAX_BALANCE_AGE)\
+        if stream_live else now
+
+    # Page through portfolios by primary key
+    last_pk = None
+    while True:
+        batch_queryset = queryset.order_by('pk')
+        if last_pk is not None:
+            batch_queryset = batch_queryset.filter(pk__gt=last_pk)
+        portfolios = list(batch_queryset\
+            .prefetch_related('profile__user__accounts__balances')[:batch_size])
+        if not portfolios:
+            break
+        last_pk = portfolios[-1].pk
+
+        collected = _collect_portfolio_data(portfolios, asset_prices, now, updated_since,
+            before_write)
+        if collected is None:
+            return
+        for data in collected:
+            yield data
+
+
+def _collect_portfolio_data(portfolios, asset_prices, now, updated_since, before_write=None):
+    """
+    Returns list of dictionaries of data needed to create a RawPortfolioData
+    instance for each of the given portfolios (with accounts and stored
+    balances prefetched).
+
+    Balances of accounts stored after updated_since are used versus
+    fetching from Horizon.
+
+    Returns None without writing anything if before_write returns False
+    after fetching from Horizon.
     """
     # Store the xlm price in USD from asset_prices dict
     usd_xlm_price = asset_prices['XLM-native']
 
-    # Map from model_asset.asset_id to model_asset.id
-    # TODO: make model_asset.asset_id unique key
-    model_asset_map = {
-        asset.asset_id: asset.id
-        for asset in Asset.objects.all()
-    }
-
-    # Accumulate stellar addresses for each user
-    portfolio_addresses = [
-        {
-            'portfolio': pt,
-            'addresses': [
-                (a, Address(address=a.public_key, network=settings.STELLAR_NETWORK))
-                for a in pt.profile.user.accounts.all()
-            ]
-        }
-        for pt in queryset.prefetch_related('profile__user__accounts')
+    # Accumulate stellar accounts for each user
+    accounts = [
+        a
+        for pt in portfolios
+        for a in pt.profile.user.accounts.all()
     ]
 
-    # Retrieve addresses from Horizon then calculate portfolio value
-    # given asset balances
+    # Retrieve balances from Horizon concurrently for only those accounts with
+    # activity since last stored, so wall-clock time depends on the number of
+    # fetch workers versus the number of changed accounts
+    fetch_accounts = [ a for a in accounts if not a.has_current_balances(updated_since) ]
+    fetch_account_ids = set(a.id for a in fetch_accounts)
+    with instrumentation.phase('horizon_fetch'):
+        account_balances = fetchers.fetch_all_account_balances(
+            [ a.public_key for a in fetch_accounts ])
+
+    # NOTE: Fetching can take long enough for the caller to lose its claim
+    # on these portfolios (e.g. a performance shard lease)
+    if before_write and not before_write():
+        return None
+
+    # Store fetched balances for valuation in following runs
+    fetched_accounts = [ a for a in fetch_accounts
+        if account_balances.get(a.public_key) is not None ]
+    with instrumentation.phase('balance_store'):
+        AccountBalance.objects.replace({
+            a.id: account_balances[a.public_key]
+            for a in fetched_accounts
+        })
+        Account.objects.set_balances_synced(fetched_accounts, now)
+
+    # Accumulate assets each account and user trusts to sync in bulk after
+    trustline_sync = trustlines.TrustlineSynchronizer()
+
+    # Calculate portfolio value given fetched or stored asset balances
     ret = []
-    for obj in portfolio_addresses:
-        pt = obj['portfolio']
-        pt_addrs = obj['addresses']
-        pt_user = pt.profile.user
-        pt_asset_ids = [ ] # NOTE: keep track of asset_ids in pt to update list of assets user trusts
-
-        # Only record portfolio value if user has registered at least one account
-        if pt_addrs:
-            # Get xlm_val added for each asset held in each account
-            xlm_val = 0.0
-            for acc, a in pt_addrs:
-                try:
-                    a.get()
-
-                    acc_asset_ids = [ ] # NOTE; keep track of asset_ids in account to update list of assets this account trusts
-                    for b in a.balances:
-                        # Get the asset id and price for asset
-                        asset_id = '{0}-{1}'.format(b['asset_code'], b['asset_issuer']) if b['asset_type'] != 'native' else 'XLM-native'
-
-                        price = asset_prices.get(asset_id, 0.0) if b['asset_type'] != 'native' else 1.0
+    with instrumentation.phase('valuation'):
+        for pt in portfolios:
+            pt_accounts = pt.profile.user.accounts.all()
+            pt_user = pt.profile.user
+            pt_asset_ids = [ ] # NOTE: keep track of asset_ids in pt to update list of assets user trusts
+            pt_complete = True # NOTE: False if any account balances failed to load from Horizon
+
+            # Only record portfolio value if user has registered at least one account
+            if pt_accounts:
+                # Get xlm_val added for each asset held in each account
+                xlm_val = 0.0
+                for acc in pt_accounts:
+                    if acc.id not in fetch_account_ids:
+                        # No activity since last stored so use stored balances
+                        balances = tuple( (b.asset_id, b.balance) for b in acc.balances.all() )
+                    elif acc.public_key not in account_balances:
+                        # Failed to load after retries so skip this portfolio's value for this run
+                        pt_complete = False
+                        continue
+                    else:
+                        balances = account_balances[acc.public_key]
+
+                    if balances is None:
+                        # If it doesn't exist on the Stellar network, then remove account record from db
+                        acc.delete()
+                        continue
+
+                    for asset_id, balance in balances:
+                        # Get the price for asset
+                        price = asset_prices.get(asset_id, 0.0) if asset_id != 'XLM-native' else 1.0
 
                         # Store the involved asset ids
-                        acc_asset_ids.append(asset_id)
                         pt_asset_ids.append(asset_id)
 
                         # Update the total value
-                        xlm_val += float(b['balance']) * price
+                        xlm_val += balance * price
 
-                    # Update the list of assets this account trusts in db
-                    acc.assets_trusting.clear()
-                    acc.assets_trusting.add(*Asset.objects.filter(asset_id__in=acc_asset_ids))
+                    # Update the list of assets this account trusts
+                    trustline_sync.set_account_assets(acc.id, [ asset_id for asset_id, balance in balances ])
 
-                except AccountNotExistError:
-                    # If it doesn't exist on the Stellar network, then remove account record from db
-                    acc.delete()
+                # Append to return iterable a dict of the data
+                if pt_complete:
+                    ret.append({ 'portfolio_id': pt.pk, 'xlm_value': xlm_val, 'usd_value': xlm_val * usd_xlm_price })
 
-            # Append to return iterable a dict of the data
-            ret.append({ 'portfolio': pt, 'xlm_value': xlm_val, 'usd_value': xlm_val * usd_xlm_price })
+            # Update the list of assets the user associated with the profile trusts
+            if pt_complete:
+                trustline_sync.set_user_assets(pt_user.id, pt_asset_ids)
 
-        # Update the list of assets the user associated with the profile trusts in db
-        pt_user.assets_trusting.clear()
-        pt_user.assets_trusting.add(*Asset.objects.filter(asset_id__in=pt_asset_ids))
+    # Apply only the trust changes to the db
+    with instrumentation.phase('trustline_sync'):
+        trustline_sync.sync()
 
     return ret
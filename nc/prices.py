@@ -0,0 +1,138 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from stellar_base.asset import Asset as StellarAsset
+
+from . import fetchers
+from .models import AssetPrice
+from .ticker import TickerService
+
+
+class PriceOracle(object):
+    """
+    Assembles current market prices of model assets.
+
+    Prices come from the shared StellarTerm ticker cache, with
+    concurrent Horizon order book calls only for assets missing from the
+    ticker. Illiquid assets whose order books keep coming back empty are
+    skipped for an exponentially growing backoff period.
+
+    If an order book can't be fetched, the asset's last recorded price is
+    used, so a transient Horizon error isn't mistaken for an empty book.
+    """
+    EMPTY_BOOK_SKIP_KEY = 'price_oracle:empty_book:skip:{0}'
+    EMPTY_BOOK_COUNT_KEY = 'price_oracle:empty_book:count:{0}'
+
+    def _fetch_ticker_prices(self):
+        """
+        Returns tuple of (usd_xlm_price, { asset_id: xlm_price }) from
+        the StellarTerm ticker.
+        """
+        ticker = TickerService().get(max_age=settings.STELLARTERM_TICKER_CACHE_TTL)
+        xlm_prices = {
+            asset_id: float(a['price_XLM'])
+            for asset_id, a in ticker.assets.iteritems()
+            if a.get('price_XLM') is not None
+        }
+        return ticker.usd_xlm_price, xlm_prices
+
+    def _fetch_order_book_price(self, model_asset):
+        """
+        Returns the first bid price in XLM for model_asset from the
+        Horizon order book, or None if there are no bids.
+
+        Portfolio value is market price user can sell asset at for XLM.
+        """
+        asset = StellarAsset(model_asset.code, model_asset.issuer_address)
+        params = {
+            'selling_asset_type': asset.type,
+            'selling_asset_code': asset.code,
+            'selling_asset_issuer': asset.issuer,
+            'buying_asset_type': 'native',
+            'buying_asset_code': StellarAsset.native().code,
+        }
+        json = fetchers.get_json('{0}/order_book/'.format(settings.STELLAR_HORIZON),
+            params=params)
+
+        # Use the first bid price if there is one
+        if 'bids' in json and len(json['bids']) > 0:
+            return float(json['bids'][0]['price'])
+        return None
+
+    def _last_known_price(self, model_asset):
+        """
+        Returns the latest recorded XLM price of model_asset, or None if it
+        has none.
+        """
+        asset_price = AssetPrice.objects.filter(asset=model_asset)\
+            .order_by('-created').only('xlm_price').first()
+        return asset_price.xlm_price if asset_price else None
+
+    def _is_backing_off(self, asset_id):
+        return cache.get(self.EMPTY_BOOK_SKIP_KEY.format(asset_id)) is not None
+
+    def _record_empty_book(self, asset_id):
+        """
+        Skip order book calls for asset_id for a backoff period that doubles
+        each consecutive time its order book is empty.
+        """
+        count_key = self.EMPTY_BOOK_COUNT_KEY.format(asset_id)
+        count = cache.get(count_key, 0)
+        backoff = min(settings.PRICE_ORACLE_EMPTY_BOOK_BACKOFF * (2 ** count),
+            settings.PRICE_ORACLE_EMPTY_BOOK_MAX_BACKOFF)
+        cache.set(self.EMPTY_BOOK_SKIP_KEY.format(asset_id), True, backoff)
+        cache.set(count_key, count + 1, backoff * 2)
+
+    def _clear_empty_book(self, asset_id):
+        cache.delete_many([
+            self.EMPTY_BOOK_SKIP_KEY.format(asset_id),
+            self.EMPTY_BOOK_COUNT_KEY.format(asset_id),
+        ])
+
+    def get_asset_prices(self, model_assets):
+        """
+        Returns dictionary { asset_id: price } of current market prices
+        for the given model assets.
+
+        If not native, market prices in XLM. Otherwise, in USD. Assets whose
+        order book couldn't be fetched get their last recorded price, or are
+        left out if they have none.
+        """
+        usd_price, ticker_prices = self._fetch_ticker_prices()
+
+        asset_prices = {}
+        order_book_assets = []
+        for model_asset in model_assets:
+            if not model_asset.issuer_address:
+                # Then native so store current price in USD
+                asset_prices[model_asset.asset_id] = usd_price
+            elif model_asset.asset_id in ticker_prices:
+                asset_prices[model_asset.asset_id] = ticker_prices[model_asset.asset_id]
+            elif self._is_backing_off(model_asset.asset_id):
+                # NOTE: Backoff is only set after an empty book, which has no bid price
+                asset_prices[model_asset.asset_id] = 0.0
+            else:
+                order_book_assets.append(model_asset)
+
+        # Fall back to the order book for assets missing from the ticker
+        def _fetch(model_asset):
+            try:
+                return (model_asset, self._fetch_order_book_price(model_asset), None)
+            except Exception as e:
+                return (model_asset, None, e)
+
+        for model_asset, price, error in fetchers.map_concurrent(_fetch, order_book_assets):
+            if error:
+                print 'Error occurred fetching order book for {0}: {1}'.format(model_asset, error)
+                # NOTE: Leave out assets with no price history versus recording them at 0.0
+                last_price = self._last_known_price(model_asset)
+                if last_price is not None:
+                    asset_prices[model_asset.asset_id] = last_price
+                continue
+            elif price is None:
+                self._record_empty_book(model_asset.asset_id)
+            else:
+                self._clear_empty_book(model_asset.asset_id)
+            asset_prices[model_asset.asset_id] = price if price is not None else 0.0
+
+        return asset_prices
@@ -0,0 +1,147 @@
+import threading, time, uuid
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+
+class AssetRecord(namedtuple('AssetRecord', [ 'id', 'asset_id', 'code', 'issuer_id',
+    'issuer_address', 'domain', 'verified', 'pic', 'toml_pic' ])):
+    """
+    Compact read-only copy of an Asset, with pic stored as the file name.
+    """
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def pic_url(self):
+        Asset = apps.get_model('nc', 'Asset')
+        pic_url = Asset.DEFAULT_PIC_URL
+        if self.pic:
+            pic_url = Asset._meta.get_field('pic').storage.url(self.pic)
+        elif self.toml_pic:
+            pic_url = self.toml_pic
+        return pic_url
+
+    def href(self):
+        return reverse('nc:asset-detail', kwargs={'slug': self.asset_id})
+
+
+class AssetRegistry(object):
+    """
+    Process-local map from asset_id and (code, issuer_address) to AssetRecord
+    for every asset in the db.
+
+    Asset writes bump a version in the shared cache, which each process
+    checks at most once per check interval before reloading its registry.
+    Writes made in this process invalidate its registry immediately, or
+    once at the end of a batch of writes.
+    """
+    VERSION_KEY = 'asset:registry:version'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batch = threading.local()
+        self._version = None
+        self._checked = 0
+        self._by_asset_id = None
+        self._by_pair = None
+
+    def _load(self, version):
+        Asset = apps.get_model('nc', 'Asset')
+        records = [ AssetRecord(*values) for values in Asset.objects.exclude(asset_id=None)\
+            .values_list(*AssetRecord._fields) ]
+        self._by_asset_id = { r.asset_id: r for r in records }
+        self._by_pair = { (r.code, r.issuer_address): r for r in records }
+        self._version = version
+
+    def _records(self):
+        """
+        Returns the current dicts of records by asset_id and by pair,
+        reloading them if the version has changed.
+        """
+        with self._lock:
+            now = time.time()
+            if self._by_asset_id is None or now - self._checked >= settings.ASSET_REGISTRY_VERSION_CHECK_INTERVAL:
+                version = cache.get(self.VERSION_KEY)
+                if version is None:
+                    # NOTE: Another process may have set it first, so reread
+                    cache.add(self.VERSION_KEY, uuid.uuid4().hex, None)
+                    version = cache.get(self.VERSION_KEY)
+                if self._by_asset_id is None or version != self._version:
+                    self._load(version)
+                self._checked = now
+            return self._by_asset_id, self._by_pair
+
+    def invalidate(self):
+        """
+        Drop this process's records and bump the shared version, so all
+        processes reload on their next check.
+
+        NOTE: Inside batch(), only marks the registry for invalidation on exit.
+        """
+        if getattr(self._batch, 'active', False):
+            self._batch.pending = True
+            return
+
+        cache.set(self.VERSION_KEY, uuid.uuid4().hex, None)
+        with self._lock:
+            self._by_asset_id = None
+            self._by_pair = None
+
+    @contextmanager
+    def batch(self):
+        """
+        Invalidate at most once, on exit, for asset writes made by this
+        thread in the enclosed block.
+        """
+        if getattr(self._batch, 'active', False):
+            yield
+            return
+
+        self._batch.active = True
+        self._batch.pending = False
+        try:
+            yield
+        finally:
+            self._batch.active = False
+            if self._batch.pending:
+                self.invalidate()
+
+    def get(self, asset_id, default=None):
+        """
+        Returns the AssetRecord with asset_id.
+        """
+        return self._records()[0].get(asset_id, default)
+
+    def get_by_pair(self, code, issuer_address, default=None):
+        """
+        Returns the AssetRecord with code and issuer_address (None if native).
+        """
+        return self._records()[1].get((code, issuer_address), default)
+
+    def pk_map(self, asset_ids):
+        """
+        Returns dict of { asset_id: pk } for the given asset_ids in the db.
+
+        Any missing from the registry are looked up in the db, in case they
+        were created in another process since the last version check.
+        """
+        by_asset_id = self._records()[0]
+        pks = { asset_id: by_asset_id[asset_id].id for asset_id in asset_ids
+            if asset_id in by_asset_id }
+
+        missing = set(asset_ids).difference(pks.keys())
+        if missing:
+            Asset = apps.get_model('nc', 'Asset')
+            pks.update(Asset.objects.filter(asset_id__in=missing).values_list('asset_id', 'id'))
+        return pks
+
+
+assets = AssetRegistry()
@@ -5,15 +5,24 @@ from algoliasearch_django import update_records
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models.signals import (
-    m2m_changed, pre_save, post_save,
+    m2m_changed, post_delete, pre_save, post_save,
 )
 from django.dispatch import receiver
 
-from .models import Account, Asset, Profile
+from . import dirty, follows, index, registry, teasers
+from .models import Account, Asset, FollowerIndexDelta, Profile
+
+
+# Fields derived data is synced from, so syncs only run when they change
+USER_PROFILE_SYNC_FIELDS = ('first_name', 'last_name')
+PROFILE_ACCOUNT_SYNC_FIELDS = ('full_name', 'pic', 'is_private')
+ASSET_REGISTRY_FIELDS = ('asset_id', 'code', 'issuer', 'issuer_address', 'domain',
+    'verified', 'pic', 'toml_pic')
 
 
 # Profile
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+# NOTE: Strong reference since the Profile receiver below reuses the name
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, weak=False)
 def update_model_user_details(sender, instance, created, **kwargs):
     """
     Keep profile.full_name, account.user_full_name, account.user_pic_url
@@ -24,13 +33,22 @@ def update_model_user_details(sender, instance, created, **kwargs):
 
     Use update_records to bulk update all accounts associated with user profile
     for index.AccountIndex.
+
+    Only saves the profile if the user's name changed (e.g. not on last_login
+    updates).
     """
     # Ignore created instance because it won't have a profile
-    if instance.id and not created:
+    if instance.id and not created and dirty.changed(instance, USER_PROFILE_SYNC_FIELDS):
+        # NOTE: Users created without the signup adapter (e.g. createsuperuser)
+        # may not have a profile yet
+        try:
+            profile = instance.profile
+        except Profile.DoesNotExist:
+            return
+
         # Change profile full name attr
-        profile = instance.profile
         profile.full_name = instance.get_full_name()
-        profile.save()
+        profile.save(update_fields=['full_name'])
 
 
 @receiver(pre_save, sender=Profile)
@@ -54,11 +72,14 @@ def update_model_user_details(sender, instance, created, **kwargs):
     """
     Keep account.profile_is_private in sync with user.profile instance.
 
-    Use update_records to bulk update all accounts associated with profile.
+    Use update_records to bulk update all accounts associated with profile,
+    only if a field they're built from changed.
     """
     # Ignore created instance because it won't have accounts
+    if created or not dirty.changed(instance, PROFILE_ACCOUNT_SYNC_FIELDS):
+        return
     user = instance.user
-    if user.id and not created:
+    if user.id:
         # Update all associated accounts
         profile_is_private = [0] if not instance.is_private else [1] # NOTE: Need this to be a list of ints in order to work with OR bool alongside viewable_by_if_private
         user_full_name = user.get_full_name()
@@ -69,24 +90,56 @@ def update_model_user_details(sender, instance, created, **kwargs):
 
 
 @receiver(m2m_changed, sender=Profile.followers.through)
-def update_profile_followers_count(sender, instance, **kwargs):
+def update_profile_followers(sender, instance, action, reverse, pk_set, **kwargs):
     """
-    Keep profile.followers_count, profile.viewable_by_if_private in sync
-    with profile.followers.count() and profile.followers.all().
+    Keep profile.followers_count, the follow graph, mutual follow teasers and
+    the search index in sync with profile.followers.
 
-    Need to use profile.save() versus update since index.ProfileIndex
-    is synced to the post_save signal of Profile model.
+    Changes are turned into (follower_id, profile_id) edges. NOTE: Profile pk
+    is the user id, so reverse changes from user.profiles_following are
+    (user, profile) edges.
 
-    To update viewable_by_if_private (since proxy method), use
-    update_records()
+    followers_count is updated atomically versus through profile.save(), and
+    index.ProfileIndex and index.AccountIndex (for viewable_by_if_private)
+    are updated in debounced batches by index.follower_sync.
     """
-    instance.followers_count = instance.followers.count()
-    instance.save()
+    if action in ('pre_remove', 'pre_clear'):
+        # Store the edges that exist, as pk_set is None on clear and includes
+        # any not followed on remove
+        if reverse:
+            edges = Profile.followers.through.objects.filter(user_id=instance.pk)
+            if action == 'pre_remove':
+                edges = edges.filter(profile_id__in=pk_set)
+        else:
+            edges = Profile.followers.through.objects.filter(profile_id=instance.pk)
+            if action == 'pre_remove':
+                edges = edges.filter(user_id__in=pk_set)
+        instance._removed_follow_edges = list(edges.values_list('user_id', 'profile_id'))
+        return
+    elif action == 'post_add':
+        if reverse:
+            edges = [ (instance.pk, profile_id) for profile_id in pk_set ]
+        else:
+            edges = [ (user_id, instance.pk) for user_id in pk_set ]
+    elif action in ('post_remove', 'post_clear'):
+        edges = getattr(instance, '_removed_follow_edges', [])
+    else:
+        return
+
+    if not edges:
+        return
+    followed = (action == 'post_add')
+
+    deltas = {}
+    for follower_id, profile_id in edges:
+        deltas[profile_id] = deltas.get(profile_id, 0) + (1 if followed else -1)
+    Profile.objects.change_followers_count(deltas)
+
+    follows.graph.apply(edges, follow=followed)
+    teasers.mutual.follows_changed(edges)
 
-    follower_ids = [ u.id for u in instance.followers.all()\
-        .union(get_user_model().objects.filter(id=instance.user.id)) ]
-    update_records(Account, instance.user.accounts.all(),
-        viewable_by_if_private=follower_ids)
+    FollowerIndexDelta.objects.record(edges, followed)
+    index.follower_sync.schedule()
 
 
 # Asset
@@ -115,3 +168,43 @@ def update_asset(sender, instance, **kwargs):
             # Parse url and replace protocol so always https
             new_url_val = urlparse.urlparse(url_val)._replace(scheme='https').geturl()
             setattr(instance, attr, new_url_val)
+
+@receiver(m2m_changed, sender=Asset.trusters.through)
+def update_asset_trusters_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep asset.trusters_count in sync with asset.trusters.count() and
+    invalidate the asset's mutual follow teasers.
+
+    Use update versus save since trusters_count isn't in index.AssetIndex.
+    """
+    if action == 'pre_clear' and reverse:
+        # Store the assets the user trusted, as pk_set is None on clear
+        instance._cleared_asset_pks = list(instance.assets_trusting.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            asset_pks = [ instance.pk ]
+        elif action == 'post_clear':
+            asset_pks = getattr(instance, '_cleared_asset_pks', [])
+        else:
+            asset_pks = pk_set
+        Asset.objects.update_trusters_count(asset_pks)
+        teasers.mutual.trusters_changed(asset_pks)
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+def invalidate_asset_registry(sender, instance, signal, **kwargs):
+    """
+    Have asset registries reload to pick up the saved or deleted asset,
+    if saved with changes to fields the registry stores.
+    """
+    if signal is post_delete or dirty.changed(instance, ASSET_REGISTRY_FIELDS):
+        registry.assets.invalidate()
+
+
+# Dirty field tracking
+# NOTE: Connected last so pre_save receivers above that set fields run first
+dirty.track(get_user_model(), USER_PROFILE_SYNC_FIELDS)
+dirty.track(Profile, set(index.ProfileIndex.tracked_fields + PROFILE_ACCOUNT_SYNC_FIELDS))
+dirty.track(Account, index.AccountIndex.tracked_fields)
+dirty.track(Asset, set(index.AssetIndex.tracked_fields + ASSET_REGISTRY_FIELDS))
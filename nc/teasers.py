@@ -0,0 +1,157 @@
+import bisect, uuid
+
+from array import array
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .follows import FollowGraph, graph
+
+
+class TeaserCache(object):
+    """
+    Short teasers of "people you follow who also ..." for profile and asset
+    pages, cached per (viewer, target).
+
+    Teasers are computed by intersecting the viewer's sorted following ids
+    with the target's sorted follower (or truster) ids. Keys include versions
+    of the viewer's following, the user's followers and the asset's trusters,
+    so follow and trust changes invalidate every teaser they affect by
+    bumping a version.
+
+    Only ids of teaser users are cached, with their usernames loaded on
+    each call, so renamed users aren't shown under their old username.
+    """
+    FOLLOWING_VERSION_KEY = 'teaser:version:following:{0}'
+    FOLLOWERS_VERSION_KEY = 'teaser:version:followers:{0}'
+    TRUSTERS_VERSION_KEY = 'teaser:version:trusters:{0}'
+    TRUSTERS_KEY = 'teaser:trusters:{0}:{1}'
+    FOLLOWERS_TEASER_KEY = 'teaser:followers:ids:{0}:{1}:{2}:{3}:{4}'
+    TRUSTERS_TEASER_KEY = 'teaser:trusters:ids:{0}:{1}:{2}:{3}:{4}'
+
+    def _versions(self, keys):
+        """
+        Returns list of versions for the given version keys, starting any
+        that are missing.
+        """
+        versions = cache.get_many(keys)
+        missing = [ key for key in keys if key not in versions ]
+        if missing:
+            for key in missing:
+                # NOTE: Another process may have set it first, so reread
+                cache.add(key, uuid.uuid4().hex, settings.TEASER_CACHE_TIMEOUT)
+            versions.update(cache.get_many(missing))
+        return [ versions.get(key) for key in keys ]
+
+    def _truster_ids(self, asset_pk, version):
+        """
+        Returns sorted array of ids of users trusting the asset.
+        """
+        key = self.TRUSTERS_KEY.format(asset_pk, version)
+        ids = cache.get(key)
+        if ids is None:
+            through = apps.get_model('nc', 'Asset').trusters.through
+            ids = array('i', sorted(through.objects.filter(asset_id=asset_pk)\
+                .values_list('user_id', flat=True)))
+            cache.set(key, ids, settings.TEASER_CACHE_TIMEOUT)
+        return ids
+
+    def _teaser_ids(self, user_ids, size):
+        """
+        Returns list of ids of the first size users by username.
+        """
+        if not user_ids:
+            return []
+        return list(get_user_model().objects.filter(id__in=user_ids)\
+            .order_by(Lower('username')).values_list('id', flat=True)[0:size])
+
+    def _teaser(self, teaser_ids):
+        """
+        Returns list of dicts with id and current username for the users
+        with teaser_ids, by username.
+        """
+        if not teaser_ids:
+            return []
+        return list(get_user_model().objects.filter(id__in=teaser_ids)\
+            .order_by(Lower('username')).values('id', 'username'))
+
+    def followers_teaser(self, viewer_id, user_id, size=2):
+        """
+        Returns tuple of (teaser, count) for followers of user_id that
+        viewer_id follows, with teaser the first size of them by username.
+        """
+        if not viewer_id:
+            return [], 0
+
+        viewer_version, user_version = self._versions([
+            self.FOLLOWING_VERSION_KEY.format(viewer_id),
+            self.FOLLOWERS_VERSION_KEY.format(user_id),
+        ])
+        key = self.FOLLOWERS_TEASER_KEY.format(viewer_id, viewer_version,
+            user_id, user_version, size)
+        cached = cache.get(key)
+        if cached is None:
+            ids = graph.followers_followed_by(viewer_id, user_id)
+            cached = { 'teaser_ids': self._teaser_ids(ids, size), 'count': len(ids) }
+            cache.set(key, cached, settings.TEASER_CACHE_TIMEOUT)
+        return self._teaser(cached['teaser_ids']), cached['count']
+
+    def trusters_teaser(self, viewer_id, asset_pk, size=2):
+        """
+        Returns tuple of (is_trusting, teaser, count) for whether viewer_id
+        trusts the asset and the trusters viewer_id follows, with teaser the
+        first size of them by username.
+        """
+        if not viewer_id:
+            return False, [], 0
+
+        viewer_version, asset_version = self._versions([
+            self.FOLLOWING_VERSION_KEY.format(viewer_id),
+            self.TRUSTERS_VERSION_KEY.format(asset_pk),
+        ])
+        key = self.TRUSTERS_TEASER_KEY.format(viewer_id, viewer_version,
+            asset_pk, asset_version, size)
+        cached = cache.get(key)
+        if cached is None:
+            truster_ids = self._truster_ids(asset_pk, asset_version)
+            i = bisect.bisect_left(truster_ids, viewer_id)
+            ids = FollowGraph.intersect(graph.following_ids(viewer_id), truster_ids)
+            cached = {
+                'is_trusting': i < len(truster_ids) and truster_ids[i] == viewer_id,
+                'teaser_ids': self._teaser_ids(ids, size),
+                'count': len(ids),
+            }
+            cache.set(key, cached, settings.TEASER_CACHE_TIMEOUT)
+        return cached['is_trusting'], self._teaser(cached['teaser_ids']), cached['count']
+
+    def _bump(self, keys):
+        cache.set_many({ key: uuid.uuid4().hex for key in keys },
+            settings.TEASER_CACHE_TIMEOUT)
+
+    def follows_changed(self, edges):
+        """
+        Invalidate teasers affected by (follower_id, target_id) edges being
+        added or removed, once the current transaction commits.
+        """
+        keys = set()
+        for follower_id, target_id in edges:
+            keys.add(self.FOLLOWING_VERSION_KEY.format(follower_id))
+            keys.add(self.FOLLOWERS_VERSION_KEY.format(target_id))
+        if keys:
+            transaction.on_commit(lambda: self._bump(keys))
+
+    def trusters_changed(self, asset_pks):
+        """
+        Invalidate teasers of assets whose trusters changed, once the current
+        transaction commits.
+        """
+        keys = set([ self.TRUSTERS_VERSION_KEY.format(asset_pk) for asset_pk in asset_pks ])
+        if keys:
+            transaction.on_commit(lambda: self._bump(keys))
+
+
+mutual = TeaserCache()
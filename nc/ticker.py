@@ -0,0 +1,86 @@
+import threading, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from . import fetchers
+
+
+class Ticker(object):
+    """
+    Parsed StellarTerm ticker, with assets indexed by asset id.
+    """
+    def __init__(self, data):
+        self.assets = data['assets']
+        self.external_prices = data['external_prices']
+        self.fetched = data['fetched']
+
+    def get(self, asset_id, default=None):
+        """
+        Returns the ticker asset dict for asset_id.
+        """
+        return self.assets.get(asset_id, default)
+
+    @property
+    def usd_xlm_price(self):
+        return float(self.external_prices['USD_XLM'])
+
+    @property
+    def xlm_change24h_USD(self):
+        # NOTE: Need to get USD/XLM 24 hour change from _meta key (not in XLM-native asset)
+        return self.external_prices.get('USD_XLM_change')
+
+
+class TickerService(object):
+    """
+    Serves the StellarTerm ticker from the shared cache.
+
+    Once cached data is older than the TTL, it's still served while a single
+    background thread (across all processes sharing the cache) refreshes it.
+    Only requests made while nothing is cached wait on the download.
+    """
+    CACHE_KEY = 'stellarterm:ticker'
+    REFRESH_LOCK_KEY = 'stellarterm:ticker:refresh'
+
+    def _fetch(self):
+        """
+        Download and parse the ticker, storing it in the cache.
+        """
+        json = fetchers.get_json(settings.STELLARTERM_TICKER_URL)
+        data = {
+            'assets': { a['id']: a for a in json.get('assets', []) },
+            'external_prices': json.get('_meta', {}).get('externalPrices', {}),
+            'fetched': time.time(),
+        }
+        cache.set(self.CACHE_KEY, data, settings.STELLARTERM_TICKER_CACHE_MAX_AGE)
+        return data
+
+    def _refresh(self):
+        try:
+            self._fetch()
+        except Exception as e:
+            print 'Error occurred refreshing StellarTerm ticker: {0}'.format(e)
+        finally:
+            cache.delete(self.REFRESH_LOCK_KEY)
+            connection.close()
+
+    def get(self, max_age=None):
+        """
+        Returns the current Ticker.
+
+        If max_age (in seconds) is given, data older than that is refreshed
+        before returning versus served stale.
+        """
+        data = cache.get(self.CACHE_KEY)
+        if data is None or (max_age is not None and time.time() - data['fetched'] >= max_age):
+            return Ticker(self._fetch())
+
+        # Stale so refresh in background if no one else already is
+        if time.time() - data['fetched'] >= settings.STELLARTERM_TICKER_CACHE_TTL\
+            and cache.add(self.REFRESH_LOCK_KEY, True, settings.STELLARTERM_TICKER_REFRESH_TIMEOUT):
+            thread = threading.Thread(target=self._refresh)
+            thread.daemon = True
+            thread.start()
+
+        return Ticker(data)
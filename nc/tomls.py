@@ -0,0 +1,185 @@
+import hashlib, json, requests, threading, toml
+
+from bulk_update.helper import bulk_update
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from . import fetchers, instrumentation, registry
+from .models import Asset, TomlFile
+
+
+class TomlRefresher(object):
+    """
+    Updates assets from the stellar.toml files on their issuers' home domains.
+
+    Toml urls are looked up once per issuer on Horizon, and each distinct
+    toml file is fetched once, no matter how many assets point to it. Files
+    are fetched concurrently with a timeout, conditionally on the stored
+    ETag/Last-Modified, and only parsed when their content has changed.
+    """
+    HORIZON_ASSETS_LIMIT = 200
+
+    def _fetch_toml_urls(self, issuer_address):
+        """
+        Returns dict of { asset code: toml url } for assets of the issuer
+        on Horizon, or None if Horizon couldn't be reached.
+        """
+        toml_urls = {}
+        params = { 'asset_issuer': issuer_address, 'limit': self.HORIZON_ASSETS_LIMIT }
+        try:
+            while True:
+                json = fetchers.get_json('{0}/assets'.format(settings.STELLAR_HORIZON), params=params)
+                records = json.get('_embedded', {}).get('records', [])
+                for record in records:
+                    toml_urls[record['asset_code']] = record.get('_links', {})\
+                        .get('toml', {}).get('href') or None
+                if len(records) < self.HORIZON_ASSETS_LIMIT:
+                    return toml_urls
+                params['cursor'] = records[-1]['paging_token']
+        except Exception as e:
+            print 'Error occurred fetching assets of {0}: {1}'.format(issuer_address, e)
+            return None
+
+    def _fetch_toml(self, toml_file):
+        """
+        Conditionally fetch the toml file, updating toml_file in place.
+
+        Returns True if fetched (or not modified), False if the file couldn't
+        be reached and None if it couldn't be used.
+        """
+        headers = {}
+        if toml_file.etag:
+            headers['If-None-Match'] = toml_file.etag
+        if toml_file.last_modified:
+            headers['If-Modified-Since'] = toml_file.last_modified
+
+        try:
+            r = fetchers.get(toml_file.url, headers=headers,
+                timeout=settings.TOML_FETCH_TIMEOUT, retries=0)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+            fetchers.TransientFetchError):
+            return False
+
+        if r.status_code == requests.codes.not_modified:
+            toml_file.fetched = timezone.now()
+            return True
+        elif r.status_code != requests.codes.ok:
+            print 'Error occurred fetching {0}: status {1}'.format(toml_file.url, r.status_code)
+            return None
+
+        toml_file.etag = r.headers.get('ETag')
+        toml_file.last_modified = r.headers.get('Last-Modified')
+        toml_file.fetched = timezone.now()
+
+        # Only parse if content differs from that last fetched
+        content_hash = hashlib.sha256(r.content).hexdigest()
+        if content_hash == toml_file.content_hash:
+            return True
+
+        try:
+            parsed_toml = toml.loads(r.text)
+        except Exception as e:
+            print 'Error occurred parsing {0}: {1}'.format(toml_file.url, e)
+            return None
+
+        toml_file.content_hash = content_hash
+        toml_file.currencies = json.dumps(parsed_toml.get('CURRENCIES', []))
+        return True
+
+    def refresh(self, asset_qs):
+        """
+        Update each asset in asset_qs from its toml file.
+
+        Returns number of assets updated from a toml file.
+        """
+        model_assets = list(asset_qs)
+
+        # Look up toml urls once per issuer
+        with instrumentation.phase('horizon_fetch'):
+            issuers = list(set([ a.issuer_address for a in model_assets ]))
+            issuer_toml_urls = dict(zip(issuers,
+                fetchers.map_concurrent(self._fetch_toml_urls, issuers)))
+
+        # Group assets by toml url, skipping those of issuers we couldn't look up
+        assets_by_url = defaultdict(list)
+        for model_asset in model_assets:
+            toml_urls = issuer_toml_urls[model_asset.issuer_address]
+            if toml_urls is not None:
+                assets_by_url[toml_urls.get(model_asset.code)].append(model_asset)
+
+        # Fetch each distinct toml file once
+        with instrumentation.phase('toml_fetch'):
+            toml_urls = [ url for url in assets_by_url.keys() if url ]
+            toml_files = { f.url: f for f in TomlFile.objects.filter(url__in=toml_urls) }
+            for url in toml_urls:
+                if url not in toml_files:
+                    toml_files[url] = TomlFile(url=url)
+            fetch_results = dict(zip(toml_urls, fetchers.map_concurrent(
+                self._fetch_toml, [ toml_files[url] for url in toml_urls ],
+                workers=settings.TOML_FETCH_WORKERS)))
+
+        count = 0
+        with instrumentation.phase('toml_update'), registry.assets.batch():
+            for url, url_assets in assets_by_url.items():
+                # NOTE: Assets are unverified if their toml file can't be reached
+                parsed_toml = None
+                if url:
+                    if fetch_results[url] is None:
+                        continue
+                    elif fetch_results[url]:
+                        parsed_toml = toml_files[url].parsed_toml()
+
+                for model_asset in url_assets:
+                    try:
+                        model_asset.apply_toml(url, parsed_toml)
+                        count += 1
+                    except Exception as e:
+                        print 'Error occurred updating {0} from {1}: {2}'.format(model_asset, url, e)
+
+            # Store validators and currencies of files fetched
+            fetched_files = [ toml_files[url] for url, fetched in fetch_results.items()
+                if fetched and toml_files[url].content_hash ]
+            bulk_update([ f for f in fetched_files if f.pk ])
+            TomlFile.objects.bulk_create([ f for f in fetched_files if not f.pk ])
+
+        return count
+
+
+class AssetRefreshScheduler(object):
+    """
+    Refreshes an asset's Horizon stats and toml details in a background
+    thread, once they're older than the refresh interval.
+
+    Scheduling is deduplicated through the shared cache, so repeated views
+    of an asset within the interval (from any process) refresh it only once.
+    """
+    REFRESH_KEY = 'asset:refresh:{0}'
+
+    def _refresh(self, asset_pk):
+        try:
+            Asset.objects.get(pk=asset_pk).refresh_from_horizon()
+        except Exception as e:
+            print 'Error occurred refreshing asset {0}: {1}'.format(asset_pk, e)
+        finally:
+            connection.close()
+
+    def schedule(self, model_asset):
+        """
+        Start a refresh of model_asset in the background if due and not
+        already scheduled within the refresh interval.
+
+        Returns whether a refresh was started.
+        """
+        if not model_asset.issuer_address or not model_asset.is_refresh_due()\
+            or not cache.add(self.REFRESH_KEY.format(model_asset.pk), True,
+            settings.ASSET_REFRESH_INTERVAL):
+            return False
+
+        thread = threading.Thread(target=self._refresh, args=(model_asset.pk,))
+        thread.daemon = True
+        thread.start()
+        return True
@@ -0,0 +1,90 @@
+from django.apps import apps
+
+from . import registry, teasers
+
+
+class TrustlineSynchronizer(object):
+    """
+    Keeps the assets accounts and users trust in our db in sync with
+    their current balances on the Stellar network.
+
+    Accumulate the asset_ids each account and user currently holds, then
+    call sync() to compute the set difference against the existing trust
+    rows and apply only the added and removed rows, in one bulk insert and
+    one bulk delete per through table.
+    """
+    def __init__(self):
+        self.account_asset_ids = {}
+        self.user_asset_ids = {}
+
+    def set_account_assets(self, account_id, asset_ids):
+        self.account_asset_ids[account_id] = set(asset_ids)
+
+    def set_user_assets(self, user_id, asset_ids):
+        self.user_asset_ids[user_id] = set(asset_ids)
+
+    def _sync_through(self, through, owner_field, owner_asset_ids, asset_pks):
+        """
+        Diff the desired (owner, asset) pairs against the rows in the given
+        through table for the owners involved.
+
+        Returns tuple of (added, removed) (owner_id, asset_pk) pairs.
+        """
+        if not owner_asset_ids:
+            return set(), set()
+
+        desired = set(
+            (owner_id, asset_pks[asset_id])
+            for owner_id, asset_ids in owner_asset_ids.iteritems()
+            for asset_id in asset_ids
+            if asset_id in asset_pks
+        )
+        current = {
+            (owner_id, asset_pk): row_id
+            for row_id, owner_id, asset_pk in through.objects\
+                .filter(**{ owner_field + '__in': owner_asset_ids.keys() })\
+                .values_list('id', owner_field, 'asset_id')
+        }
+
+        added = desired.difference(current)
+        removed = set(current).difference(desired)
+        if added:
+            through.objects.bulk_create([
+                through(**{ owner_field: owner_id, 'asset_id': asset_pk })
+                for owner_id, asset_pk in added
+            ])
+        if removed:
+            through.objects.filter(id__in=[ current[pair] for pair in removed ]).delete()
+
+        return added, removed
+
+    def sync(self):
+        """
+        Apply the accumulated trust changes to the db.
+
+        Returns dict with the (owner_id, asset_pk) pairs added and removed
+        for 'accounts' and 'users'.
+        """
+        Asset = apps.get_model('nc', 'Asset')
+
+        # Map from asset.asset_id to asset.id for all assets involved
+        all_asset_ids = set()
+        for asset_ids in self.account_asset_ids.values() + self.user_asset_ids.values():
+            all_asset_ids.update(asset_ids)
+        asset_pks = registry.assets.pk_map(all_asset_ids) if all_asset_ids else {}
+
+        changes = {
+            'accounts': self._sync_through(Asset.account_trusters.through,
+                'account_id', self.account_asset_ids, asset_pks),
+            'users': self._sync_through(Asset.trusters.through,
+                'user_id', self.user_asset_ids, asset_pks),
+        }
+
+        # Keep trusters_count and teasers of assets whose user trust changed in sync
+        added, removed = changes['users']
+        changed_asset_pks = set([ asset_pk for user_id, asset_pk in added.union(removed) ])
+        if changed_asset_pks:
+            Asset.objects.update_trusters_count(changed_asset_pks)
+            teasers.mutual.trusters_changed(changed_asset_pks)
+
+        return changes
@@ -33,6 +33,8 @@ urlpatterns = [
     url(r'^asset/(?P<slug>[\w.@+-]+)/update/$', views.AssetUpdateView.as_view(), name='asset-update'),
     url(r'^asset/(?P<slug>[\w.@+-]+)/trust/$', views.AssetTrustListView.as_view(), name='asset-trust-list'),
     url(r'^asset/(?P<slug>[\w.@+-]+)/trusting/$', views.AssetTrustedByListView.as_view(), name='asset-trusted-by-list'),
+    url(r'^asset/(?P<slug>[\w.@+-]+)/prices/$', views.AssetPriceListView.as_view(), name='asset-price-list'),
+    url(r'^asset/(?P<slug>[\w.@+-]+)/trade_aggregations/$', views.AssetTradeAggregationListView.as_view(), name='asset-trade-aggregation-list'),
     url(r'^asset/exchange/ticker/$', views.AssetExchangeTickerListView.as_view(), name='asset-exchange-ticker'),
 
     # Leaderboard
@@ -59,4 +61,7 @@ urlpatterns = [
     # Performance
     url(r'^performance/create/$', views.PerformanceCreateView.as_view(), name='performance-create'),
     url(r'^toml/update/$', views.AssetTomlUpdateView.as_view(), name='toml-update'),
+    url(r'^market/update/$', views.AssetMarketSnapshotUpdateView.as_view(), name='market-update'),
+    url(r'^followers/index/flush/$', views.FollowerIndexFlushView.as_view(), name='follower-index-flush'),
+    url(r'^jobs/runs/$', views.JobRunListView.as_view(), name='job-run-list'),
 ]
@@ -1,20 +1,24 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-import datetime, dateutil.parser, parse, requests, stream, sys
+import datetime, dateutil.parser, os, parse, requests, socket, stream, sys, time
 
 from allauth.account.adapter import get_adapter
 from allauth.account import views as allauth_account_views
 from allauth.utils import build_absolute_uri
 
+from bulk_update.helper import bulk_update
+
+from collections import OrderedDict
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.sites.shortcuts import get_current_site
 from django.db.models import (
-    Avg, BooleanField, Case, ExpressionWrapper, F, FloatField,
-    prefetch_related_objects, Value, When,
+    BooleanField, Case, Count, ExpressionWrapper, F, FloatField, OuterRef,
+    prefetch_related_objects, Q, Subquery, Sum, Value, When,
 )
 from django.db.models.functions import Lower, Trunc
 from django.http import (
@@ -24,6 +28,7 @@ from django.http.request import QueryDict
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.crypto import get_random_string
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _
 from django.views import generic
@@ -32,7 +37,6 @@ from django.views.decorators.csrf import csrf_exempt
 from functools import partial
 
 from stellar_base.address import Address
-from stellar_base.asset import Asset as StellarAsset
 from stellar_base.operation import Operation
 from stellar_base.stellarxdr import Xdr
 from stellar_base.utils import AccountNotExistError
@@ -42,11 +46,15 @@ from stream_django.feed_manager import feed_manager
 
 from urlparse import urlparse
 
-from . import forms, mixins
+from . import follows, forms, index, instrumentation, mixins, prices, teasers
+from .candles import CandleStore, TradeAggregationStore
 from .models import (
-    Account, AccountFundRequest, Asset, FollowRequest, Portfolio,
+    Account, AccountFundRequest, Asset, AssetMarketSnapshot, AssetPrice,
+    FollowRequest, JobRun, PerformanceRun, PerformanceShard, Portfolio,
     portfolio_data_collector, Profile, RawPortfolioData,
 )
+from .ticker import TickerService
+from .tomls import AssetRefreshScheduler, TomlRefresher
 
 
 # Web app views
@@ -78,43 +86,10 @@ class HomeView(generic.TemplateView):
             'change24h_USD' ]
         context['asset_display'] = 'price_USD'
 
-        # Fetch the StellarTerm ticker json and store
-        r = requests.get(settings.STELLARTERM_TICKER_URL)
-        json = r.json()
-        ticker_assets = json.get('assets', [])
-
-        # NOTE: Need to get USD/XLM 24 hour change from _meta key (not in XLM-native asset)
-        xlm_change24h_USD = None
-        if '_meta' in json and 'externalPrices' in json['_meta']\
-        and 'USD_XLM_change' in json['_meta']['externalPrices']:
-            xlm_change24h_USD = json['_meta']['externalPrices']['USD_XLM_change']
-
-        # Clean the ticker assets to only include those that have
-        # the display attribute
-        cleaned_ticker_assets = [
-            a for a in ticker_assets
-            if a['id'] == 'XLM-native' or ('activityScore' in a and a['activityScore'] != None)
-        ]
-
-        # Parse to get asset_ids for queryset filter
-        top_asset_ids = [ a['id'] for a in cleaned_ticker_assets ]
-
-        # Store the dict version of ticker assets
-        ticker_assets = { a['id']: a for a in cleaned_ticker_assets }
-
-        # Order the qset by activityScore
-        # TODO: Figure out how to annotate qset properly
-        assets = list(Asset.objects.filter(asset_id__in=top_asset_ids))
-        for a in assets:
-            for display in context['allowed_asset_displays']:
-                if a.asset_id == 'XLM-native' and display == 'change24h_USD':
-                    # Handling the XLM-native USD % change edge case
-                    setattr(a, display, xlm_change24h_USD)
-                else:
-                    setattr(a, display, ticker_assets[a.asset_id].get(display))
-        assets.sort(key=lambda a: getattr(a, 'activityScore'), reverse=True)
-
-        context['asset_list'] = assets[:5]
+        # Order assets in the market snapshot by activityScore
+        context['asset_list'] = Asset.objects.with_market_snapshot()\
+            .filter(Q(asset_id='XLM-native') | Q(market_snapshot__activity_score__isnull=False))\
+            .order_by(F('activityScore').desc(nulls_last=True))[:5]
 
         return context
 
@@ -190,7 +165,8 @@ class SignupUserUpdateView(LoginRequiredMixin, mixins.PrefetchedSingleObjectMixi
         return self.model.objects.filter(id=self.request.user.id)
 
 
-class SignupUserFollowingUpdateView(LoginRequiredMixin, generic.ListView):
+class SignupUserFollowingUpdateView(LoginRequiredMixin, mixins.FollowStatusQuerysetMixin,
+    generic.ListView):
     template_name = 'account/signup_profile_follow_update_form.html'
 
     def get_queryset(self):
@@ -198,30 +174,11 @@ class SignupUserFollowingUpdateView(LoginRequiredMixin, generic.ListView):
         Queryset is users sorted by performance rank.
         Prefetch assets_trusting to also preview portfolio assets with each list item.
         """
-        # Aggregate the users current user is following and has requested to follow
-        # for annotation
-        is_following_ids = [
-            u.id for u in get_user_model().objects\
-                .filter(profile__in=self.request.user.profiles_following.all())
-        ]
-        requested_to_follow_ids = [
-            r.user.id for r in self.request.user.requests_to_follow.all()
-        ]
-
         # Only return top 25 users
-        return get_user_model().objects\
+        qset = get_user_model().objects\
             .exclude(profile__portfolio__rank=None)\
-            .filter(profile__portfolio__rank__lte=25)\
-            .annotate(is_following=Case(
-                When(id__in=is_following_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
-            .annotate(requested_to_follow=Case(
-                When(id__in=requested_to_follow_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
+            .filter(profile__portfolio__rank__lte=25)
+        return self.annotate_follow_status(qset)\
             .prefetch_related('assets_trusting', 'profile__portfolio')\
             .order_by('profile__portfolio__rank')
 
@@ -248,8 +205,9 @@ class UserDetailView(mixins.PrefetchedSingleObjectMixin, mixins.IndexContextMixi
         context = super(UserDetailView, self).get_context_data(**kwargs)
         if self.object:
             # Update the context for follow attrs
-            context['followers_count'] = self.object.profile.followers.count()
-            context['following_count'] = self.object.profiles_following.count()
+            context['followers_count'] = follows.graph.followers_count(self.object.id)
+            context['following_count'] = follows.graph.following_count(self.object.id)
+            # NOTE: Read from the db versus the follow graph, since it gates private profile details
             context['is_following'] = self.object.profile.followers\
                 .filter(id=self.request.user.id).exists() if self.request.user.is_authenticated else False
             context['requested_to_follow'] = self.object.follower_requests\
@@ -257,14 +215,10 @@ class UserDetailView(mixins.PrefetchedSingleObjectMixin, mixins.IndexContextMixi
 
             # Update the context for short teaser line of users
             # who follow self.object that self.request.user also follows
-            q_followers_user_follows = self.object.profile.followers\
-                .filter(profile__in=self.request.user.profiles_following.all())\
-                .order_by(Lower('username'))\
-                if self.request.user.is_authenticated\
-                else get_user_model().objects.none()
-            context['followers_user_follows_teaser'] = q_followers_user_follows[0:2]
+            context['followers_user_follows_teaser'], followers_user_follows_count = \
+                teasers.mutual.followers_teaser(self.request.user.id, self.object.id)
             context['followers_user_follows_teaser_count'] = len(context['followers_user_follows_teaser'])
-            context['followers_user_follows_teaser_more_count'] = q_followers_user_follows.count() - context['followers_user_follows_teaser_count']
+            context['followers_user_follows_teaser_more_count'] = followers_user_follows_count - context['followers_user_follows_teaser_count']
 
         return context
 
@@ -381,6 +335,7 @@ class UserFollowUpdateView(LoginRequiredMixin, mixins.PrefetchedSingleObjectMixi
         self.success_url = request.POST.get('success_url', None)
 
         if self.object and self.object != self.request.user:
+            # NOTE: Read from the db versus the follow graph, which is for display
             is_following = self.object.profile.followers\
                 .filter(id=request.user.id).exists()
 
@@ -568,7 +523,8 @@ class UserFollowRequestDeleteView(LoginRequiredMixin, mixins.PrefetchedSingleObj
 
 
 class UserFollowerListView(LoginRequiredMixin, mixins.IndexContextMixin,
-    mixins.ViewTypeContextMixin, generic.ListView):
+    mixins.ViewTypeContextMixin, mixins.FollowStatusQuerysetMixin,
+    generic.ListView):
     template_name = 'nc/profile_follow_list.html'
     paginate_by = 50
     view_type = 'profile'
@@ -596,14 +552,6 @@ class UserFollowerListView(LoginRequiredMixin, mixins.IndexContextMixin,
         if self.object.id != self.request.user.id and not self.is_following and self.profile.is_private:
             raise Http404('No %s matches the given query.' % get_user_model()._meta.object_name)
 
-        is_following_ids = [
-            u.id for u in get_user_model().objects\
-                .filter(profile__in=self.request.user.profiles_following.all())
-        ]
-        requested_to_follow_ids = [
-            r.user.id for r in self.request.user.requests_to_follow.all()
-        ]
-
         # Check whether we're in Followed By list view page
         # If so, then filter queryset by users current user also follows
         self.in_followers_user_follows = ('true' == self.request.GET.get('followed_by', 'false')) # Default to False
@@ -611,21 +559,13 @@ class UserFollowerListView(LoginRequiredMixin, mixins.IndexContextMixin,
         if self.in_followers_user_follows:
             qset = qset.filter(profile__in=self.request.user.profiles_following.all())
 
-        return qset.annotate(is_following=Case(
-                When(id__in=is_following_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
-            .annotate(requested_to_follow=Case(
-                When(id__in=requested_to_follow_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
+        return self.annotate_follow_status(qset)\
             .order_by(Lower('first_name'))\
             .prefetch_related('profile')
 
 class UserFollowingListView(LoginRequiredMixin, mixins.IndexContextMixin,
-    mixins.ViewTypeContextMixin, generic.ListView):
+    mixins.ViewTypeContextMixin, mixins.FollowStatusQuerysetMixin,
+    generic.ListView):
     template_name = 'nc/profile_follow_list.html'
     paginate_by = 50
     view_type = 'profile'
@@ -653,25 +593,9 @@ class UserFollowingListView(LoginRequiredMixin, mixins.IndexContextMixin,
         if self.object.id != self.request.user.id and not self.is_following and self.profile.is_private:
             raise Http404('No %s matches the given query.' % get_user_model()._meta.object_name)
 
-        is_following_ids = [
-            u.id for u in get_user_model().objects\
-                .filter(profile__in=self.request.user.profiles_following.all())
-        ]
-        requested_to_follow_ids = [
-            r.user.id for r in self.request.user.requests_to_follow.all()
-        ]
-        return get_user_model().objects\
-            .filter(profile__in=self.object.profiles_following.all())\
-            .annotate(is_following=Case(
-                When(id__in=is_following_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
-            .annotate(requested_to_follow=Case(
-                When(id__in=requested_to_follow_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
+        qset = get_user_model().objects\
+            .filter(profile__in=self.object.profiles_following.all())
+        return self.annotate_follow_status(qset)\
             .order_by(Lower('first_name'))\
             .prefetch_related('profile')
 
@@ -739,14 +663,39 @@ class UserPortfolioDataListView(mixins.JSONResponseMixin, generic.TemplateView):
         })
         context.update(params)
 
-        # Retrieve the raw data with values aggregated based on interval length specified
-        q_portfolio_raw_data = portfolio.rawdata.filter(created__gte=start, created__lte=end)\
+        # Retrieve the pre-aggregated values for the interval length specified,
+        # starting from the beginning of the interval start falls in
+        start = start.replace(minute=0, second=0, microsecond=0)
+        if resolution != 'hour':
+            start = start.replace(hour=0)
+        if resolution == 'month':
+            start = start.replace(day=1)
+        start = timezone.make_aware(start, timezone.utc)
+        end = timezone.make_aware(end, timezone.utc)
+
+        sums = OrderedDict(
+            (r['time'], (r[value_attr + '_sum'], r['count']))
+            for r in portfolio.rollups.filter(resolution=resolution,
+                time__gte=start, time__lte=end).order_by('time')\
+                .values('time', value_attr + '_sum', 'count')
+        )
+
+        # Include recent raw data that hasn't been rolled up yet
+        q_pending_raw_data = portfolio.rawdata\
+            .filter(rolled_up=False, created__gte=start, created__lte=end)\
             .annotate(time=Trunc('created', resolution)).values('time')\
-            .annotate(value=Avg(value_attr)).order_by('time')
+            .annotate(value_sum=Sum(value_attr), count=Count('id')).order_by('time')
+        for d in q_pending_raw_data:
+            value_sum, count = sums.get(d['time'], (0.0, 0))
+            sums[d['time']] = (value_sum + d['value_sum'], count + d['count'])
 
         # Parse for appropriate json format then update context
         json = {
-            'results': [ d for d in q_portfolio_raw_data ]
+            'results': [
+                { 'time': time, 'value': value_sum / count }
+                for time, (value_sum, count) in sorted(sums.items())
+                if count
+            ]
         }
         context.update(json)
 
@@ -980,42 +929,20 @@ class AssetDetailView(mixins.PrefetchedSingleObjectMixin, mixins.IndexContextMix
 
     def get_context_data(self, **kwargs):
         """
-        Override to include asset from Horizon API GET.
+        Override to include trust related info and exchange pair names.
         """
-        # Use horizon object.assets() with params:
-        # https://github.com/StellarCN/py-stellar-base/blob/v0.2/stellar_base/horizon.py
         context = super(AssetDetailView, self).get_context_data(**kwargs)
 
         is_native = (self.object.issuer_address == None)
         context.update({'is_native': is_native})
 
-        record = None
         if not is_native:
             # Include the issuer URL on Horizon
             context['asset_issuer_stellar_href'] = settings.STELLAR_EXPERT_ACCOUNT_URL + self.object.issuer_address
 
-            # Retrieve asset record from Horizon
-            horizon = settings.STELLAR_HORIZON_INITIALIZATION_METHOD()
-            params = {
-                'asset_issuer': self.object.issuer_address,
-                'asset_code': self.object.code,
-            }
-            json = horizon.assets(params=params)
-
-            # Store the asset record from Horizon in context
-            # NOTE: On testnet, won't get a record if mainnet issuer id isn't the same as testnet's
-            record = None
-            if '_embedded' in json and 'records' in json['_embedded'] and json['_embedded']['records']:
-                record = json['_embedded']['records'][0]
-
-            # Update existing model asset in our db
-            # General try, except here because always want to return asset
-            # obj no matter what
-            try:
-                self.object = self._update_asset(record)
-                context.update({'object': self.object})
-            except:
-                pass
+            # Render from stored details, refreshing them from Horizon and
+            # the toml file in the background if stale
+            AssetRefreshScheduler().schedule(self.object)
         else:
             # Include the external exchange pair name for client side
             # JSON parsing
@@ -1029,23 +956,11 @@ class AssetDetailView(mixins.PrefetchedSingleObjectMixin, mixins.IndexContextMix
             context['counter_code'] = counter_code
             context['exchange_pair_name'] = exchange_pair_name
 
-        context['asset'] = record
-
-        # Update the context for trust related info
-        context['is_trusting'] = self.object.trusters\
-            .filter(id=self.request.user.id).exists()\
-            if self.request.user.is_authenticated\
-            else False
-        context['trusters_count'] = self.object.trusters.count()
-
-        # Update the context for short teaser line of users
+        # Update the context for trust related info and short teaser line of users
         # who trust self.object that self.request.user also follows
-        q_trusters_user_follows = self.object.trusters\
-            .filter(profile__in=self.request.user.profiles_following.all())\
-            .order_by(Lower('username'))\
-            if self.request.user.is_authenticated\
-            else get_user_model().objects.none()
-        context['trusters_user_follows_teaser'] = q_trusters_user_follows[0:2]
+        context['is_trusting'], context['trusters_user_follows_teaser'], _ = \
+            teasers.mutual.trusters_teaser(self.request.user.id, self.object.id)
+        context['trusters_count'] = self.object.trusters_count
         context['trusters_user_follows_teaser_count'] = len(context['trusters_user_follows_teaser'])
         context['trusters_teaser_more_count'] = context['trusters_count'] - context['trusters_user_follows_teaser_count']
         if context['is_trusting']:
@@ -1057,27 +972,90 @@ class AssetDetailView(mixins.PrefetchedSingleObjectMixin, mixins.IndexContextMix
 
         return context
 
-    def _update_asset(self, record):
+
+class AssetPriceListView(mixins.JSONResponseMixin, generic.TemplateView):
+    template_name = "nc/asset_price_list.html"
+
+    def render_to_response(self, context):
         """
-        Update model asset instance given fetched asset record from Horizon call.
+        Returns only JSON. Not meant for actual HTML page viewing.
+        In future, transition this to DRF API endpoint.
+        """
+        return self.render_to_json_response(context)
 
-        Returns updated model_asset.
+    def get_context_data(self, **kwargs):
+        """
+        Context is price history data for given asset, recorded by the
+        performance cron job.
 
-        NOTE: Technically shouldn't be creating on a GET, but ignore this
-        as it might be a good way to incrementally accumulate model assets
-        in the beginning.
+        Requires URL to have query params 'start' and 'end' as UTC timestamps
+        in milliseconds, with optional 'counter_code' of USD or XLM.
         """
-        model_asset = self.object
+        context = {}
+        params = self.request.GET.copy()
 
-        # Use toml attribute of record to update instance from toml file (to fetch)
-        toml_url = record['_links']['toml']['href']\
-            if record and '_links' in record and 'toml' in record['_links']\
-            and 'href' in record['_links']['toml']\
-            else None
+        self.object = get_object_or_404(Asset, asset_id=self.kwargs['slug'])
+
+        # Determine the counter asset to use
+        allowed_counter_codes = ['USD', 'XLM']
+        counter_code = params.get('counter_code', 'USD')
+        if counter_code not in allowed_counter_codes:
+            counter_code = allowed_counter_codes[0] # default to USD
+            params['counter_code'] = counter_code
+        value_attr = '{0}_price'.format(counter_code.lower())
+
+        # Get the start, end query params
+        try:
+            start = datetime.datetime.utcfromtimestamp(float(params.get('start')) / 1000.0)
+            end = datetime.datetime.utcfromtimestamp(float(params.get('end')) / 1000.0)
+        except (TypeError, ValueError):
+            raise Http404('Invalid start or end')
+
+        # Two week range loads hour data, otherwise daily data
+        resolution = 'hour' if end - start < datetime.timedelta(days=14) else 'day'
+
+        # Update the params with asset_id and counter code. Then add to the context
+        params.update({
+            'asset_id': self.object.asset_id
+        })
+        context.update(params)
+
+        # Retrieve the pre-aggregated prices for the interval length specified,
+        # starting from the beginning of the interval start falls in
+        start = start.replace(minute=0, second=0, microsecond=0)
+        if resolution != 'hour':
+            start = start.replace(hour=0)
+        start = timezone.make_aware(start, timezone.utc)
+        end = timezone.make_aware(end, timezone.utc)
+
+        sums = OrderedDict(
+            (r['time'], (r[value_attr + '_sum'], r['count']))
+            for r in self.object.price_rollups.filter(resolution=resolution,
+                time__gte=start, time__lte=end).order_by('time')\
+                .values('time', value_attr + '_sum', 'count')
+        )
+
+        # Include recent prices that haven't been rolled up yet
+        q_pending_prices = self.object.prices\
+            .filter(rolled_up=False, created__gte=start, created__lte=end)\
+            .annotate(time=Trunc('created', resolution)).values('time')\
+            .annotate(value_sum=Sum(value_attr), count=Count('id')).order_by('time')
+        for d in q_pending_prices:
+            value_sum, count = sums.get(d['time'], (0.0, 0))
+            sums[d['time']] = (value_sum + d['value_sum'], count + d['count'])
+
+        # Parse for appropriate json format then update context
+        context['results'] = [
+            { 'time': time, 'value': value_sum / count }
+            for time, (value_sum, count) in sorted(sums.items())
+            if count
+        ]
 
-        model_asset.update_from_toml(toml_url)
+        # Add last recorded price
+        latest_price = self.object.prices.first()
+        context['latest_value'] = getattr(latest_price, value_attr) if latest_price else None
 
-        return model_asset
+        return context
 
 
 class AssetExchangeTickerListView(mixins.JSONResponseMixin, generic.TemplateView):
@@ -1093,7 +1071,7 @@ class AssetExchangeTickerListView(mixins.JSONResponseMixin, generic.TemplateView
     def get_context_data(self, **kwargs):
         """
         Context is paginated ticker history for given asset pair
-        response from Kraken.
+        from candles stored locally, in the format of the Kraken response.
 
         Requires URL to have query param 'interval' and optional 'since'.
 
@@ -1105,7 +1083,7 @@ class AssetExchangeTickerListView(mixins.JSONResponseMixin, generic.TemplateView
         """
         # NOTE: https://www.kraken.com/help/api#get-ohlc-data
         context = {}
-        params = self.request.GET.copy()
+        params = self.request.GET
 
         # Determine the counter asset to use (to base of XLM)
         allowed_pairs = {
@@ -1114,39 +1092,93 @@ class AssetExchangeTickerListView(mixins.JSONResponseMixin, generic.TemplateView
         }
         counter_code = self.request.GET.get('counter_code', 'USD') # Default to USD
         exchange_pair_name = allowed_pairs[counter_code]
-        params.update({ 'pair': exchange_pair_name })
 
-        # Pop the start, end query param if there (to use later when filtering of resp data)
-        start = float(params.pop('start')[0]) if 'start' in params else None
-        end = float(params.pop('end')[0]) if 'end' in params else None
-
-        # NOTE: Kraken requires query for interval to be in mins and since
-        # to be in secs.
+        # NOTE: Kraken requires query for interval to be in mins and records
+        # are stored with time in secs.
         # From getResolution() in asset_chart.js, we pass in (interval, since)
-        # in milliseconds, so need to convert
-        if 'interval' in params:
-            params['interval'] = str(int(params['interval']) / (60 * 1000))
-
-        if 'since' in params:
-            params['since'] = str(float(params['since']) / 1000.0)
-
-        full_url = '{0}?{1}'.format(settings.KRAKEN_TICKER_URL, params.urlencode())
-        r = requests.get(full_url)
-        if r.status_code == requests.codes.ok:
-            # NOTE: Each <time> in record is returned by Kraken in seconds
-            # so need to convert back to milliseconds for client
-            ret = r.json()
-            if 'result' in ret and exchange_pair_name in ret['result']:
-                ret['result'][exchange_pair_name] = [
+        # and start, end in milliseconds, so need to convert
+        interval = int(params['interval']) / (60 * 1000) if 'interval' in params else 1
+        if interval not in settings.KRAKEN_OHLC_INTERVALS:
+            context.update({ 'error': [ 'EGeneral:Invalid arguments' ] })
+            return context
+
+        since = float(params['since']) / 1000.0 if 'since' in params else None
+        start = float(params['start']) / 1000.0 if 'start' in params else None
+        end = float(params['end']) / 1000.0 if 'end' in params else None
+
+        # Serve from the local candle store, which only fetches newer
+        # candles from Kraken
+        records, last = CandleStore(exchange_pair_name, interval)\
+            .get_records(since=since, start=start, end=end)
+
+        # NOTE: Each <time> in record is stored in seconds
+        # so need to convert back to milliseconds for client
+        context.update({
+            'error': [],
+            'result': {
+                exchange_pair_name: [
                     [record[0] * 1000] + record[1:]
-                    for record in ret['result'][exchange_pair_name]
-                    if (not start or record[0] * 1000 > start) and (not end or record[0] * 1000 < end)
-                ]
-            context.update(ret)
+                    for record in records
+                ],
+                'last': last,
+            }
+        })
 
         return context
 
 
+class AssetTradeAggregationListView(mixins.JSONResponseMixin, generic.TemplateView):
+    template_name = "nc/asset_trade_aggregation_list.html"
+
+    def render_to_response(self, context):
+        """
+        Returns only JSON. Not meant for actual HTML page viewing.
+        In future, transition this to DRF API endpoint.
+        """
+        return self.render_to_json_response(context)
+
+    def get_context_data(self, **kwargs):
+        """
+        Context is trade aggregations for given non-native asset against XLM
+        from buckets stored locally, in the format of the Horizon response.
+
+        Requires URL to have query params 'resolution', 'start' and 'end',
+        all in milliseconds.
+
+        Response from Horizon has JSON format
+        { '_embedded': { 'records': [record] } }
+
+        with record = { 'timestamp', 'trade_count', 'base_volume',
+            'counter_volume', 'avg', 'high', 'low', 'open', 'close' }
+        """
+        # NOTE: https://www.stellar.org/developers/horizon/reference/endpoints/trade_aggregations.html
+        self.object = get_object_or_404(Asset.objects.exclude(issuer_address=None),
+            asset_id=self.kwargs['slug'])
+        params = self.request.GET
+
+        try:
+            resolution = int(params['resolution'])
+            start = int(params['start'])
+            end = int(params['end'])
+        except (KeyError, ValueError):
+            raise Http404('Invalid resolution, start or end')
+        if resolution not in settings.HORIZON_TRADE_AGGREGATION_RESOLUTIONS:
+            raise Http404('Invalid resolution')
+
+        # Limit the number of buckets that can be requested at once
+        start = max(start, end - settings.HORIZON_TRADE_AGGREGATION_MAX_BUCKETS * resolution)
+
+        # Serve from the local bucket store, which only fetches buckets not
+        # yet stored and the open and grace period buckets from Horizon
+        records = TradeAggregationStore(self.object, resolution).get_records(start, end)
+
+        return {
+            '_embedded': {
+                'records': records,
+            },
+        }
+
+
 class AssetUpdateView(LoginRequiredMixin, mixins.PrefetchedSingleObjectMixin,
     mixins.IndexContextMixin, mixins.ViewTypeContextMixin, generic.UpdateView):
     model = Asset
@@ -1251,7 +1283,8 @@ class AssetTrustListView(LoginRequiredMixin, mixins.IndexContextMixin,
 
 
 class AssetTrustedByListView(LoginRequiredMixin, mixins.IndexContextMixin,
-    mixins.ViewTypeContextMixin, generic.ListView):
+    mixins.ViewTypeContextMixin, mixins.FollowStatusQuerysetMixin,
+    generic.ListView):
     template_name = 'nc/asset_trusted_by_list.html'
     paginate_by = 50
     view_type = 'asset'
@@ -1274,15 +1307,8 @@ class AssetTrustedByListView(LoginRequiredMixin, mixins.IndexContextMixin,
         Queryset is this user's accounts but store the Asset instance as well.
         """
         self.object = get_object_or_404(Asset, asset_id=self.kwargs['slug'])
-        is_following_ids = [
-            u.id for u in get_user_model().objects\
-                .filter(profile__in=self.request.user.profiles_following.all())
-        ]
-        return self.object.trusters.annotate(is_following=Case(
-                When(id__in=is_following_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
+        return self.annotate_follow_status(self.object.trusters.all(),
+                requested_to_follow=False)\
             .order_by(Lower('first_name'))\
             .prefetch_related('profile')
 
@@ -1302,8 +1328,6 @@ class AssetTopListView(mixins.IndexContextMixin, mixins.ViewTypeContextMixin,
         """
         context = super(AssetTopListView, self).get_context_data(**kwargs)
 
-        # Set ticker assets
-        context['ticker_assets'] = self.ticker_assets
         context['allowed_displays'] = self.allowed_displays
         context['display'] = self.display
         context['counter_code'] = self.counter_code
@@ -1317,7 +1341,7 @@ class AssetTopListView(mixins.IndexContextMixin, mixins.ViewTypeContextMixin,
 
     def get_queryset(self):
         """
-        Queryset is assets with asset_id in StellarTerm ticker list, sorted
+        Queryset is assets with a StellarTerm ticker market snapshot, sorted
         by either StellarTerm activityScore, price in USD/XLM, change 24h in USD/XLM.
 
         Query params have key, val options
@@ -1344,30 +1368,6 @@ class AssetTopListView(mixins.IndexContextMixin, mixins.ViewTypeContextMixin,
         if self.order_by not in self.allowed_orderings:
             self.order_by = self.allowed_orderings[0] # default to descending
 
-        # Fetch the StellarTerm ticker json and store
-        r = requests.get(settings.STELLARTERM_TICKER_URL)
-        json = r.json()
-        ticker_assets = json.get('assets', [])
-
-        # NOTE: Need to get USD/XLM 24 hour change from _meta key (not in XLM-native asset)
-        xlm_change24h_USD = None
-        if '_meta' in json and 'externalPrices' in json['_meta']\
-        and 'USD_XLM_change' in json['_meta']['externalPrices']:
-            xlm_change24h_USD = json['_meta']['externalPrices']['USD_XLM_change']
-
-        # Clean the ticker assets to only include those that have
-        # the display attribute
-        cleaned_ticker_assets = [
-            a for a in ticker_assets
-            if a['id'] == 'XLM-native' or (self.display in a and a[self.display] != None)
-        ]
-
-        # Parse to get asset_ids for queryset filter
-        top_asset_ids = [ a['id'] for a in cleaned_ticker_assets ]
-
-        # Store the dict version of ticker assets
-        self.ticker_assets = { a['id']: a for a in cleaned_ticker_assets }
-
         # Aggregate the assets current user is trusting for annotation
         is_trusting_asset_ids = []
         if self.request.user.is_authenticated:
@@ -1375,25 +1375,19 @@ class AssetTopListView(mixins.IndexContextMixin, mixins.ViewTypeContextMixin,
                 a.asset_id for a in self.request.user.assets_trusting.all()
             ]
 
-        # Order the qset
-        # TODO: Figure out how to annotate qset properly versus this loop
-        qset = Asset.objects.filter(asset_id__in=top_asset_ids)\
+        # Order the qset by display attribute in the market snapshot
+        return Asset.objects.with_market_snapshot()\
+            .filter(Q(asset_id='XLM-native') | Q(**{
+                'market_snapshot__{0}__isnull'.format(AssetMarketSnapshot.DISPLAY_FIELDS[self.display]): False
+            }))\
             .annotate(is_trusting=Case(
                 When(asset_id__in=is_trusting_asset_ids, then=Value(True)),
                 default=Value(False),
                 output_field=BooleanField(),
-            ))
-        assets = list(qset)
-        for a in assets:
-            for display in self.allowed_displays:
-                if a.asset_id == 'XLM-native' and display == 'change24h_USD':
-                    # Handling the XLM-native USD % change edge case
-                    setattr(a, display, xlm_change24h_USD)
-                else:
-                    setattr(a, display, self.ticker_assets[a.asset_id].get(display))
-        assets.sort(key=lambda a: getattr(a, self.display), reverse=(self.order_by == "desc"))
+            ))\
+            .order_by(F(self.display).desc(nulls_last=True) if self.order_by == 'desc'\
+                else F(self.display).asc(nulls_first=True), 'id')
 
-        return assets
 
 
 ## Leaderboard
@@ -1404,7 +1398,7 @@ class LeaderboardRedirectView(generic.RedirectView):
 class LeaderboardListView(mixins.IndexContextMixin, mixins.ViewTypeContextMixin,
     mixins.LoginRedirectContextMixin, mixins.DepositAssetsContextMixin,
     mixins.UserFollowerRequestsContextMixin, mixins.UserPortfolioContextMixin,
-    generic.ListView):
+    mixins.FollowStatusQuerysetMixin, generic.ListView):
     template_name = "nc/leaderboard_list.html"
     paginate_by = 50
     view_type = 'leaderboard'
@@ -1448,30 +1442,7 @@ class LeaderboardListView(mixins.IndexContextMixin, mixins.ViewTypeContextMixin,
         self.performance_attr = 'performance_{0}'.format(self.date_span)
         order = 'profile__portfolio__performance_{0}'.format(self.date_span)
 
-        # Aggregate the users current user is following and has requested to follow
-        # for annotation
-        is_following_ids = []
-        requested_to_follow_ids = []
-        if self.request.user.is_authenticated:
-            is_following_ids = [
-                u.id for u in get_user_model().objects\
-                    .filter(profile__in=self.request.user.profiles_following.all())
-            ]
-            requested_to_follow_ids = [
-                r.user.id for r in self.request.user.requests_to_follow.all()
-            ]
-
-        return get_user_model().objects\
-            .annotate(is_following=Case(
-                When(id__in=is_following_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
-            .annotate(requested_to_follow=Case(
-                When(id__in=requested_to_follow_ids, then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField(),
-            ))\
+        return self.annotate_follow_status(get_user_model().objects.all())\
             .prefetch_related('assets_trusting', 'profile__portfolio')\
             .filter(profile__portfolio__xlm_value__gt=settings.STELLAR_CREATE_ACCOUNT_QUOTA * float(settings.STELLAR_CREATE_ACCOUNT_MINIMUM_BALANCE) * 5.0)\
             .order_by(F(order).desc(nulls_last=True))[:100]
@@ -1692,101 +1663,212 @@ class PerformanceCreateView(generic.View):
     AWS EB worker tier cron job POSTs to url endpoint associated with
     this view.
     """
+    # Performance stat attributes with the span each is calculated over
+    performance_spans = OrderedDict([
+        ('performance_1d', datetime.timedelta(days=1)),
+        ('performance_1w', datetime.timedelta(days=7)),
+        ('performance_1m', datetime.timedelta(days=30)),
+        ('performance_3m', datetime.timedelta(days=90)),
+        ('performance_6m', datetime.timedelta(days=180)),
+        ('performance_1y', datetime.timedelta(days=365)),
+    ])
+
     def _assemble_asset_prices(self):
         """
         Assemble a dictionary { asset_id: xlm_price } of current
         market prices in xlm of all assets in our db.
         """
-        asset_prices = {}
-        for model_asset in Asset.objects.all():
-            # NOTE: Expensive! but no other way to implement as far as I see.
-            asset = StellarAsset(model_asset.code, model_asset.issuer_address)
-            xlm = StellarAsset.native()
-            if asset.is_native():
-                # Then a is native so retrieve current price in USD
-                # from StellarTerm
-                r = requests.get(settings.STELLARTERM_TICKER_URL)
-                json = r.json()
-                usd_price = float(json['_meta']['externalPrices']['USD_XLM'])
-                asset_prices[model_asset.asset_id] = usd_price
-            else:
-                # Get the orderbook. Portfolio value is market price user
-                # can sell asset at for XLM.
-                # Retrieve asset record from Horizon
-                horizon = settings.STELLAR_HORIZON_INITIALIZATION_METHOD()
-                params = {
-                    'selling_asset_type': asset.type,
-                    'selling_asset_code': asset.code,
-                    'selling_asset_issuer': asset.issuer,
-                    'buying_asset_type': 'native',
-                    'buying_asset_code': xlm.code
-                }
-                json = horizon.order_book(params=params)
-
-                # Use the first bid price if there is one
-                price = 0.0
-                if 'bids' in json and len(json['bids']) > 0:
-                    price = float(json['bids'][0]['price'])
-                asset_prices[model_asset.asset_id] = price
-
-        return asset_prices
-
-    def _record_portfolio_values(self, asset_prices):
+        return prices.PriceOracle().get_asset_prices(Asset.objects.all())
+
+    def _record_portfolio_values(self, asset_prices, queryset=None):
         """
         Use the given asset_prices dictionary to record current
-        portfolio values for all accounts in our db.
+        portfolio values for all accounts in our db (or only those in
+        the given portfolio queryset).
+        """
+        if queryset is None:
+            queryset = Portfolio.objects.all()
+        with instrumentation.phase('db_write'):
+            RawPortfolioData.objects.record(queryset,
+                partial(portfolio_data_collector, asset_prices=asset_prices),
+                settings.PORTFOLIO_COLLECTOR_BATCH_SIZE)
+
+    def _get_or_create_run(self):
+        """
+        Get the performance run for the current cron interval slot, creating
+        it if no other worker has yet.
+
+        Only the worker holding the run's pricing lease fetches asset prices,
+        storing them with the run's shards and recording them to price history.
+        Other workers wait for the run to be priced, taking over pricing if
+        that worker's lease expires first.
+        """
+        interval = settings.PERFORMANCE_RUN_INTERVAL
+        midnight = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        elapsed = int((timezone.now() - midnight).total_seconds())
+        slot = midnight + datetime.timedelta(seconds=elapsed - elapsed % interval)
+        lease_duration = datetime.timedelta(seconds=settings.PERFORMANCE_RUN_PRICING_LEASE)
+        while True:
+            run, claimed = PerformanceRun.objects.claim_pricing(slot, lease_duration)
+            if claimed:
+                # Get asset prices
+                with instrumentation.phase('prices'):
+                    asset_prices = self._assemble_asset_prices()
+                if PerformanceRun.objects.price(run, asset_prices, settings.PERFORMANCE_SHARD_SIZE):
+                    with instrumentation.phase('prices'):
+                        AssetPrice.objects.record(asset_prices,
+                            batch_size=settings.PERFORMANCE_BULK_UPDATE_BATCH_SIZE)
+                    return run
+            elif run.asset_prices is not None:
+                return run
+            time.sleep(settings.PERFORMANCE_RUN_PRICING_POLL)
+
+    def _record_shard_values(self, shard, worker, lease_duration):
+        """
+        Record portfolio values for all portfolios in the given shard.
+
+        Each batch of values, balances and trustlines is only written if
+        worker still holds the lease on shard after fetching from Horizon,
+        so a shard reclaimed by another worker isn't recorded twice.
+        """
+        renew = partial(PerformanceShard.objects.renew, shard, worker, lease_duration)
+        collector = partial(portfolio_data_collector,
+            asset_prices=shard.run.get_asset_prices(), before_write=renew)
+
+        # NOTE: Horizon fetch, valuation phases nested in the collector are
+        # excluded from db write time
+        with instrumentation.phase('db_write'):
+            RawPortfolioData.objects.record(shard.portfolios(), collector,
+                settings.PORTFOLIO_COLLECTOR_BATCH_SIZE, before_write=renew)
+            PerformanceShard.objects.complete(shard, worker)
+
+    def _process_performance_runs(self):
+        """
+        Claim shards of recent performance runs and record portfolio values
+        for each until none are left. Then recalculate performance stats and
+        ranks if this worker is the one to finish a run.
+
+        Returns the number of shards this worker recorded, with the JobRun
+        recorded for it kept as job_run.
+        """
+        worker = '{0}:{1}:{2}'.format(socket.gethostname(), os.getpid(),
+            get_random_string(8))
+        lease_duration = datetime.timedelta(seconds=settings.PERFORMANCE_SHARD_LEASE)
+        since = timezone.now() - datetime.timedelta(seconds=settings.PERFORMANCE_RUN_MAX_AGE)
+
+        # Record time spent in each phase of this run to a JobRun
+        with instrumentation.job('performance', worker=worker) as recorder:
+            # Make sure the run for the current slot exists
+            self._get_or_create_run()
+
+            # Bulk create portfolio value time series records for claimed shards
+            shard_count = 0
+            shard = PerformanceShard.objects.claim(worker, lease_duration, since)
+            while shard:
+                self._record_shard_values(shard, worker, lease_duration)
+                shard_count += 1
+                shard = PerformanceShard.objects.claim(worker, lease_duration, since)
+
+            # Only one worker recalculates, once all shards of a run have completed
+            ranking_claimed = [
+                run for run in PerformanceRun.objects.filter(ranked=None, slot__gte=since)
+                if PerformanceRun.objects.claim_ranking(run)
+            ]
+            if ranking_claimed:
+                # For all profiles in db, recalculate performance stats
+                with instrumentation.phase('stats'):
+                    self._recalculate_performance_stats()
+
+                # Update rank values of top performing users.
+                with instrumentation.phase('rank'):
+                    self._update_rank_values()
+
+                # Roll up new raw data for portfolio and asset price charts
+                # and delete raw data past retention.
+                with instrumentation.phase('compaction'):
+                    self._compact_portfolio_data()
+                    self._compact_asset_prices()
+
+        self.job_run = recorder.job_run
+        return shard_count
+
+    def _compact_portfolio_data(self):
+        """
+        Roll up raw portfolio data into hour/day/month aggregates and delete
+        raw data older than the retention period.
+
+        Returns tuple of (rolled up, deleted) raw data counts.
         """
-        Portfolio.objects.update_timeseries('rawdata',
-            partial(portfolio_data_collector, asset_prices=asset_prices))
+        rolled_up = RawPortfolioData.objects.roll_up()
+        deleted = RawPortfolioData.objects.compact(timezone.now()\
+            - datetime.timedelta(days=settings.PORTFOLIO_RAW_DATA_RETENTION))
+        return rolled_up, deleted
+
+    def _compact_asset_prices(self):
+        """
+        Roll up asset prices into hour/day aggregates and delete prices
+        older than the retention period.
+
+        Returns tuple of (rolled up, deleted) asset price counts.
+        """
+        rolled_up = AssetPrice.objects.roll_up()
+        deleted = AssetPrice.objects.compact(timezone.now()\
+            - datetime.timedelta(days=settings.ASSET_PRICE_RAW_DATA_RETENTION))
+        return rolled_up, deleted
 
     def _recalculate_performance_stats(self):
         """
         Recalculate performance stats for all profile portfolios in our db.
-        """
-        # TODO: Expensive! Figure out how to implement this with aggregates so not looping over queries
-        for portfolio in Portfolio.objects.all():
-            # Run queries where filter on created > now - timedelta(1d, 1w, etc.) and
-            # not equal to the default of unavailable
-            # take the last() off that qset. Use USD val.
-            # 1d, 1w, 1m, 3m, 6m, 1y
-            now = timezone.now()
-
-            # NOTE: qset.last() gives None if qset is empty. otherwise, last entry. Using
-            # last because TimeSeriesModel has ordering '-created'.
-            # Adding in extra min time series interval to get attr_oldest qset
-            # due to cron job processing time (to be safe).
-            portfolio_latest_rawdata = portfolio.rawdata.first()
-            attr_oldest = {
-                'performance_1d': portfolio.rawdata.filter(created__gte=now-(datetime.timedelta(days=1) + RawPortfolioData.TIMESERIES_INTERVAL))\
-                    .exclude(usd_value=RawPortfolioData.NOT_AVAILABLE).last(),
-                'performance_1w': portfolio.rawdata.filter(created__gte=now-(datetime.timedelta(days=7) + RawPortfolioData.TIMESERIES_INTERVAL))\
-                    .exclude(usd_value=RawPortfolioData.NOT_AVAILABLE).last(),
-                'performance_1m': portfolio.rawdata.filter(created__gte=now-(datetime.timedelta(days=30) + RawPortfolioData.TIMESERIES_INTERVAL))\
-                    .exclude(usd_value=RawPortfolioData.NOT_AVAILABLE).last(),
-                'performance_3m': portfolio.rawdata.filter(created__gte=now-(datetime.timedelta(days=90) + RawPortfolioData.TIMESERIES_INTERVAL))\
-                    .exclude(usd_value=RawPortfolioData.NOT_AVAILABLE).last(),
-                'performance_6m': portfolio.rawdata.filter(created__gte=now-(datetime.timedelta(days=180) + RawPortfolioData.TIMESERIES_INTERVAL))\
-                    .exclude(usd_value=RawPortfolioData.NOT_AVAILABLE).last(),
-                'performance_1y': portfolio.rawdata.filter(created__gte=now-(datetime.timedelta(days=365) + RawPortfolioData.TIMESERIES_INTERVAL))\
-                    .exclude(usd_value=RawPortfolioData.NOT_AVAILABLE).last(),
-            }
 
-            for attr, oldest_data in attr_oldest.iteritems():
-                if oldest_data and oldest_data.usd_value != RawPortfolioData.NOT_AVAILABLE\
-                    and portfolio_latest_rawdata.usd_value != RawPortfolioData.NOT_AVAILABLE:
-                    performance = (portfolio_latest_rawdata.usd_value - oldest_data.usd_value) / oldest_data.usd_value
+        Latest raw data values and oldest raw data value within each span are
+        annotated on all portfolios with correlated subqueries, so this costs
+        a single select plus batched bulk updates versus queries per
+        portfolio per span.
+        """
+        # Annotate with subqueries where filter on created > now - timedelta(1d, 1w, etc.)
+        # and not equal to the default of unavailable, taking the oldest
+        # in each span. Use USD val.
+        # NOTE: Adding in extra min time series interval to get oldest data
+        # due to cron job processing time (to be safe).
+        now = timezone.now()
+        rawdata = RawPortfolioData.objects.filter(portfolio=OuterRef('pk'))
+        latest_rawdata = rawdata.order_by('-created')
+        annotations = {
+            'latest_usd_value': Subquery(latest_rawdata.values('usd_value')[:1],
+                output_field=FloatField()),
+            'latest_xlm_value': Subquery(latest_rawdata.values('xlm_value')[:1],
+                output_field=FloatField()),
+        }
+        for attr, span in self.performance_spans.iteritems():
+            oldest_rawdata = rawdata.filter(created__gte=now-(span + RawPortfolioData.TIMESERIES_INTERVAL))\
+                .exclude(usd_value=RawPortfolioData.NOT_AVAILABLE).order_by('created')
+            annotations['oldest_' + attr] = Subquery(oldest_rawdata.values('usd_value')[:1],
+                output_field=FloatField())
+
+        portfolios = []
+        for values in Portfolio.objects.annotate(**annotations)\
+            .values('pk', 'usd_value', 'xlm_value', *annotations.keys()):
+            portfolio = Portfolio(pk=values['pk'])
+            latest_usd_value = values['latest_usd_value']
+
+            for attr in self.performance_spans:
+                oldest_usd_value = values['oldest_' + attr]
+                if oldest_usd_value and latest_usd_value is not None\
+                    and latest_usd_value != RawPortfolioData.NOT_AVAILABLE:
+                    performance = (latest_usd_value - oldest_usd_value) / oldest_usd_value
                 else:
                     performance = None
                 setattr(portfolio, attr, performance)
 
             # Also set the latest balance values for the portfolio for easy reference
-            if portfolio_latest_rawdata:
-                portfolio.usd_value = portfolio_latest_rawdata.usd_value
-                portfolio.xlm_value = portfolio_latest_rawdata.xlm_value
-
-            # Then save the portfolio
-            portfolio.save()
+            has_rawdata = (latest_usd_value is not None)
+            portfolio.usd_value = latest_usd_value if has_rawdata else values['usd_value']
+            portfolio.xlm_value = values['latest_xlm_value'] if has_rawdata else values['xlm_value']
+            portfolios.append(portfolio)
 
+        # Then bulk update the portfolios
+        bulk_update(portfolios, update_fields=['usd_value', 'xlm_value'] + self.performance_spans.keys(),
+            batch_size=settings.PERFORMANCE_BULK_UPDATE_BATCH_SIZE, pk_field='profile_id')
 
     def _update_rank_values(self):
         """
@@ -1797,15 +1879,14 @@ class PerformanceCreateView(generic.View):
         # storing rank list.
         Portfolio.objects.exclude(rank=None).update(rank=None)
 
-        # Iterate through top 100 on yearly performance, and store the rank.
+        # Store the rank of the top 100 on daily performance in a single bulk update.
         # NOTE: Only show people on leaderboard that have added more than Nucleo allocated funds to profile
-        # TODO: Expensive! Incorporate django_bulk_update and create custom util.TimeSeries classes
-        for i, p in enumerate(list(Portfolio.objects\
+        top_pks = Portfolio.objects\
             .filter(xlm_value__gt=settings.STELLAR_CREATE_ACCOUNT_QUOTA * float(settings.STELLAR_CREATE_ACCOUNT_MINIMUM_BALANCE) * 5.0)\
             .exclude(performance_1d=None)\
-            .order_by('-performance_1d')[:100])):
-            p.rank = i + 1
-            p.save()
+            .order_by('-performance_1d').values_list('pk', flat=True)[:100]
+        bulk_update([ Portfolio(pk=pk, rank=i + 1) for i, pk in enumerate(top_pks) ],
+            update_fields=['rank'], pk_field='profile_id')
 
     def post(self, request, *args, **kwargs):
         # If worker environment, then can process cron job
@@ -1813,22 +1894,14 @@ class PerformanceCreateView(generic.View):
             # Keep track of the time cron job takes for performance reasons
             cron_start = timezone.now()
 
-            # Get asset prices
-            asset_prices = self._assemble_asset_prices()
-
-            # Bulk create portfolio value time series records for all accounts in db
-            self._record_portfolio_values(asset_prices)
-
-            # For all profiles in db, recalculate performance stats
-            self._recalculate_performance_stats()
-
-            # Update rank values of top performing users.
-            self._update_rank_values()
+            # Record portfolio values for shards of portfolios this worker claims
+            shard_count = self._process_performance_runs()
 
             # Print out length of time cron took
             cron_duration = timezone.now() - cron_start
-            print 'Performance create cron job took {0} seconds for {1} assets and {2} portfolios'.format(
+            print 'Performance create cron job took {0} seconds for {1} shards, {2} assets and {3} portfolios'.format(
                 cron_duration.total_seconds(),
+                shard_count,
                 Asset.objects.count(),
                 Portfolio.objects.count()
             )
@@ -1848,38 +1921,17 @@ class AssetTomlUpdateView(generic.View):
     def _update_assets_from_tomls(self):
         """
         For each asset in our db, update details using toml files.
-        """
-        horizon = settings.STELLAR_HORIZON_INITIALIZATION_METHOD()
-
-        # Query the database for all Asset instances and then
-        # update from toml files. Exclude XLM asset instance.
-        asset_qs = Asset.objects.exclude(issuer_address=None)
-        count = 0
-        for model_asset in asset_qs:
-            # NOTE: this is expensive!
-            params = {
-                'asset_issuer': model_asset.issuer_address,
-                'asset_code': model_asset.code,
-            }
-            json = horizon.assets(params=params)
-
-            # Store the asset record from Horizon in context
-            # NOTE: On testnet, won't get a record if mainnet issuer id isn't the same as testnet's
-            record = None
-            if '_embedded' in json and 'records' in json['_embedded'] and json['_embedded']['records']:
-                record = json['_embedded']['records'][0]
 
-            # Use toml attribute of record to update instance from toml file (to fetch)
-            toml_url = record['_links']['toml']['href']\
-                if record and '_links' in record and 'toml' in record['_links']\
-                and 'href' in record['_links']['toml']\
-                else None
-
-            try:
-                model_asset.update_from_toml(toml_url)
-                count += 1
-            except:
-                print 'Error occurred fetching {0} for {1}'.format(toml_url, model_asset)
+        The JobRun recorded for it is kept as job_run.
+        """
+        # Record time spent in each phase of this run to a JobRun
+        worker = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        with instrumentation.job('toml', worker=worker) as recorder:
+            # Query the database for all Asset instances and then
+            # update from toml files. Exclude XLM asset instance.
+            asset_qs = Asset.objects.exclude(issuer_address=None)
+            count = TomlRefresher().refresh(asset_qs)
+        self.job_run = recorder.job_run
 
         print 'Updated {0} assets from .toml files'.format(count)
 
@@ -1902,3 +1954,104 @@ class AssetTomlUpdateView(generic.View):
             return HttpResponse()
         else:
             return HttpResponseNotFound()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AssetMarketSnapshotUpdateView(generic.View):
+    """
+    Refresh asset market snapshots from the StellarTerm ticker.
+
+    AWS EB worker tier cron job POSTs to url endpoint associated with
+    this view.
+    """
+    def _refresh_market_snapshots(self):
+        """
+        Returns the number of asset market snapshots stored.
+        """
+        with instrumentation.job('market'):
+            with instrumentation.phase('ticker'):
+                ticker = TickerService().get(max_age=settings.STELLARTERM_TICKER_CACHE_TTL)
+            with instrumentation.phase('db_write'):
+                return AssetMarketSnapshot.objects.refresh(ticker)
+
+    def post(self, request, *args, **kwargs):
+        # If worker environment, then can process cron job
+        if settings.ENV_NAME == 'work':
+            # Keep track of the time cron job takes for performance reasons
+            cron_start = timezone.now()
+
+            # For all assets in ticker, refresh market snapshot
+            count = self._refresh_market_snapshots()
+
+            # Print out length of time cron took
+            cron_duration = timezone.now() - cron_start
+            print 'Asset market snapshot cron job took {0} seconds for {1} assets'.format(
+                cron_duration.total_seconds(), count)
+
+            return HttpResponse()
+        else:
+            return HttpResponseNotFound()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class FollowerIndexFlushView(generic.View):
+    """
+    Push follower changes left pending by a lost scheduled flush to the
+    search index.
+
+    AWS EB worker tier cron job POSTs to url endpoint associated with
+    this view.
+    """
+    def post(self, request, *args, **kwargs):
+        # If worker environment, then can process cron job
+        if settings.ENV_NAME == 'work':
+            # Keep track of the time cron job takes for performance reasons
+            cron_start = timezone.now()
+
+            count = index.follower_sync.sweep()
+
+            # Print out length of time cron took
+            cron_duration = timezone.now() - cron_start
+            print 'Follower index flush cron job took {0} seconds for {1} deltas'.format(
+                cron_duration.total_seconds(), count)
+
+            return HttpResponse()
+        else:
+            return HttpResponseNotFound()
+
+
+class JobRunListView(LoginRequiredMixin, mixins.JSONResponseMixin, generic.TemplateView):
+    """
+    Recent cron job runs with phase timings and external call metrics,
+    optionally filtered by job name. Only available to admins.
+    """
+    template_name = "nc/job_run_list.html"
+
+    def render_to_response(self, context):
+        """
+        Returns only JSON. Not meant for actual HTML page viewing.
+        In future, transition this to DRF API endpoint.
+        """
+        return self.render_to_json_response(context)
+
+    def get_context_data(self, **kwargs):
+        """
+        Context is list of job runs, most recent first.
+        """
+        if not self.request.user.is_superuser:
+            raise Http404('No %s matches the given query.' % JobRun._meta.object_name)
+
+        # Get the name, limit query params
+        name = self.request.GET.get('name')
+        try:
+            limit = min(int(self.request.GET.get('limit', 50)), 500)
+        except ValueError:
+            limit = 50
+
+        job_runs = JobRun.objects.all()
+        if name:
+            job_runs = job_runs.filter(name=name)
+
+        return {
+            'results': [ job_run.to_dict() for job_run in job_runs[:limit] ]
+        }
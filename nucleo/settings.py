@@ -147,6 +147,56 @@ else: # for local dev
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# NOTE: Web and worker instances share cached data (e.g. the StellarTerm ticker),
+# single-flight locks and the follow graph, so deployed environments need a
+# shared cache. Its live keys (all expire within a day) are about:
+# - 6 per active user (follow arrays, their generations and teaser versions)
+# - 1 per (viewer, profile or asset) page viewed
+# - 2 per asset (trusters array and version), plus a few per asset chart
+#   resolution and per cron lock
+#
+# Memcached (e.g. ElastiCache) at the comma separated MEMCACHED_LOCATION is used
+# if set. Items can be up to the max value length (in bytes) to fit the ticker, so
+# the servers' max item size needs to be at least as large.
+#
+# Otherwise, deployed environments fall back to a database cache. Every set/add
+# on it counts the rows of the cache table, so that cost grows with MAX_ENTRIES,
+# and once over it a set deletes 1/CULL_FREQUENCY of the entries by key, which
+# can evict cache.add locks. Only meant for low traffic (e.g. dev) environments.
+# Create its table with `python manage.py createcachetable`
+if os.environ.get('MEMCACHED_LOCATION', None): # for production
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ.get('MEMCACHED_LOCATION').split(','),
+            'OPTIONS': {
+                'server_max_value_length': int(os.environ.get('MEMCACHED_MAX_VALUE_LENGTH', 4 * 1024 * 1024)),
+            },
+        }
+    }
+elif os.environ.get('RDS_DB_NAME', None):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'nc_cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 20000)),
+                'CULL_FREQUENCY': 10,
+            },
+        }
+    }
+else: # for local dev
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 20000,
+            },
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -285,6 +335,12 @@ ALGOLIA = {
     'INDEX_SUFFIX': ENV_TYPE,
 }
 
+# Follower changes are pushed to the search index in one batch per window (in
+# seconds), with concurrent flushes prevented by a lock held up to the timeout
+ALGOLIA_FOLLOWER_SYNC_WINDOW = 5
+ALGOLIA_FOLLOWER_SYNC_BATCH_SIZE = 1000
+ALGOLIA_FOLLOWER_SYNC_LOCK_TIMEOUT = 60
+
 # AWS
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
@@ -325,6 +381,91 @@ else:
     STELLAR_HORIZON_INITIALIZATION_METHOD = horizon.horizon_livenet
     STELLAR_NETWORK = 'PUBLIC'
 
+# Horizon fetching for cron jobs: max concurrent requests, per call timeout
+# (in seconds) and retries on transient errors with exponential backoff
+HORIZON_FETCH_WORKERS = int(os.environ.get('HORIZON_FETCH_WORKERS', 16))
+HORIZON_FETCH_TIMEOUT = 10
+HORIZON_FETCH_RETRIES = 2
+HORIZON_FETCH_BACKOFF = 0.5
+
+# Asset detail pages render from stored details, refreshed from Horizon and the
+# asset's toml file in the background once older than the interval (in seconds)
+ASSET_REFRESH_INTERVAL = 60 * 60
+
+# Processes check whether their in-memory asset registry is outdated at most
+# once per interval (in seconds)
+ASSET_REGISTRY_VERSION_CHECK_INTERVAL = 5
+
+# Follow graph arrays are kept in the cache for the timeout (in seconds), with
+# incremental updates waiting up to the lock timeout (in seconds) per array
+FOLLOW_GRAPH_CACHE_TIMEOUT = 24 * 60 * 60
+FOLLOW_GRAPH_LOCK_TIMEOUT = 5
+
+# Mutual follow teasers on profile and asset pages are cached per (viewer, target)
+# for the timeout (in seconds), or until a follow or trust change invalidates them
+TEASER_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Horizon trade aggregations for non-native asset charts (resolutions in ms).
+# Buckets closed for longer than the grace period (in seconds, a few ledgers)
+# are stored once fetched. The open and grace period buckets are refetched at
+# most once per refresh period (in seconds). Only one request fetches for the
+# same asset and resolution at a time, holding a lock for up to the timeout
+# (in seconds)
+HORIZON_TRADE_AGGREGATION_RESOLUTIONS = [ 60000, 300000, 900000, 3600000, 86400000, 604800000 ]
+HORIZON_TRADE_AGGREGATION_MAX_BUCKETS = 1000
+HORIZON_TRADE_AGGREGATION_OPEN_REFRESH = 60
+HORIZON_TRADE_AGGREGATION_CLOSE_GRACE = 30
+HORIZON_TRADE_AGGREGATION_FETCH_LOCK_TIMEOUT = 30
+
+# stellar.toml files are fetched with a timeout (in seconds) on at most
+# this many concurrent requests by the asset toml cron job
+TOML_FETCH_TIMEOUT = 10
+TOML_FETCH_WORKERS = 8
+
+# Ledger stream consumer (stream_ledger_effects command). Accounts with activity
+# on the Stellar network are flagged so the performance cron only fetches those
+# from Horizon, valuing the rest from stored balances. Flags and the stream
+# cursor are flushed to the db every flush interval (in seconds). If the cursor
+# hasn't been updated within max lag (in seconds), the cron fetches all accounts.
+# Stored balances are refetched regardless once older than max balance age.
+LEDGER_STREAM_CURSOR_NAME = 'effects'
+LEDGER_STREAM_FLUSH_INTERVAL = 5
+LEDGER_STREAM_ACCOUNTS_REFRESH = 60
+LEDGER_STREAM_RECONNECT_BACKOFF = 5
+LEDGER_STREAM_MAX_LAG = 5 * 60
+LEDGER_STREAM_MAX_BALANCE_AGE = 24 * 60 * 60
+
+# Performance cron job (interval in seconds should match cron.yaml). Portfolios
+# are split into shards that worker instances lease, so a crashed worker's
+# shard is picked up again once its lease (in seconds) expires. Shards of runs
+# older than the max age (in seconds) are no longer picked up. One worker prices
+# each run under a lease (in seconds), with others checking for its prices
+# every poll interval (in seconds)
+PERFORMANCE_RUN_INTERVAL = 15 * 60
+PERFORMANCE_RUN_MAX_AGE = 60 * 60
+PERFORMANCE_RUN_PRICING_LEASE = 2 * 60
+PERFORMANCE_RUN_PRICING_POLL = 1
+PERFORMANCE_SHARD_SIZE = int(os.environ.get('PERFORMANCE_SHARD_SIZE', 100))
+PERFORMANCE_SHARD_LEASE = 10 * 60
+PERFORMANCE_BULK_UPDATE_BATCH_SIZE = 500
+
+# Portfolios valued (and raw portfolio data written) per batch in the performance
+# cron job, which bounds its memory use
+PORTFOLIO_COLLECTOR_BATCH_SIZE = int(os.environ.get('PORTFOLIO_COLLECTOR_BATCH_SIZE', 200))
+
+# Raw portfolio data older than the retention period (in days) is deleted
+# once rolled up into hour/day/month aggregates for portfolio charts. Keep
+# longer than the largest performance stat span (1y).
+PORTFOLIO_RAW_DATA_RETENTION = int(os.environ.get('PORTFOLIO_RAW_DATA_RETENTION', 400))
+
+# Asset prices recorded each performance run are deleted after the retention
+# period (in days) once rolled up into hour/day aggregates for price charts
+ASSET_PRICE_RAW_DATA_RETENTION = int(os.environ.get('ASSET_PRICE_RAW_DATA_RETENTION', 30))
+
+# Upper bounds (in seconds) of latency histogram buckets for external calls
+# recorded in cron job runs
+JOB_METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
 # StellarExpert
 if DEBUG:
     STELLAR_EXPERT_URL = 'https://stellar.expert/explorer/testnet'
@@ -343,10 +484,28 @@ STELLAR_NOTIFIER_AUTHORIZATION_FORMAT = 'Token {0}'
 # StellarTerm
 STELLARTERM_TICKER_URL = 'https://api.stellarterm.com/v1/ticker.json'
 
+# Ticker is served from the cache, refreshed in the background once older than
+# the TTL (in seconds). Cached data is dropped after max age (in seconds)
+STELLARTERM_TICKER_CACHE_TTL = 60
+STELLARTERM_TICKER_CACHE_MAX_AGE = 24 * 60 * 60
+STELLARTERM_TICKER_REFRESH_TIMEOUT = 60
+
+# Price oracle: assets missing from the ticker with empty order books are skipped
+# for a backoff (in seconds) that doubles each consecutive empty result up to the max
+PRICE_ORACLE_EMPTY_BOOK_BACKOFF = 15 * 60
+PRICE_ORACLE_EMPTY_BOOK_MAX_BACKOFF = 24 * 60 * 60
+
 # Kraken
 KRAKEN_TICKER_URL = 'https://api.kraken.com/0/public/OHLC'
 KRAKEN_XLMUSD_PAIR_NAME = 'XXLMZUSD'
 KRAKEN_XLMBTC_PAIR_NAME = 'XXLMXXBT'
+KRAKEN_OHLC_INTERVALS = [ 1, 5, 15, 30, 60, 240, 1440, 10080, 21600 ]
+
+# OHLC candles are stored locally, fetching newer candles from Kraken at most
+# once per refresh period (in seconds). Concurrent fetches for the same pair and
+# interval wait on a lock held for up to the timeout (in seconds)
+KRAKEN_CANDLE_REFRESH = 60
+KRAKEN_CANDLE_FETCH_LOCK_TIMEOUT = 30
 
 # Papaya
 PAPAYA_DOMAIN = 'apay.io'